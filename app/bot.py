@@ -1,8 +1,10 @@
+import asyncio
 import os
 import platform
 import random
 import sys
 import traceback
+from dataclasses import dataclass
 
 import discord
 from discord.ext import commands, tasks
@@ -10,22 +12,52 @@ from discord.ext.commands import Context
 
 from .cogs import cog_list
 from .common.logger import get_logger
-from .core.database import create_db_and_tables
+from .common.profile import GatewayProfile, get_cache_sizes
+from .common.startup import startup_timeline
+from .common.utils.sync import sync_tree
+from .core.database import close_db, create_db_and_tables, executor, get_pool_stats
+from .core.team.cache import close_cache, team_cache, warm_cache
+from .core.team.controller import message_cache
+from .core.team.outbound import get_outbound_stats, scheduler
+from .core.team.render import team_renderer
+from .core.team.view import TeamButton
 
 logger = get_logger(__name__)
 
 
+@dataclass
+class MessageStats:
+    seen: int = 0
+    dispatched: int = 0
+
+
 class ServantBot(commands.Bot):
-    def __init__(self, intents: discord.Intents) -> None:
+    def __init__(self, profile: GatewayProfile) -> None:
+        self.prefix = os.getenv("BOT_PREFIX", "!")
         super().__init__(
-            command_prefix=commands.when_mentioned_or(os.getenv("BOT_PREFIX", "!")),
-            intents=intents,
+            command_prefix=commands.when_mentioned_or(self.prefix),
+            intents=profile.intents,
+            member_cache_flags=profile.member_cache_flags,
+            chunk_guilds_at_startup=profile.chunk_guilds_at_startup,
+            max_messages=profile.max_messages,
             help_command=None,
         )
+        self.profile = profile
+        self.message_stats = MessageStats()
+        # prefixes of `command_prefix`, set once the bot user is known
+        self.command_prefixes: tuple[str, ...] | None = None
+
+    def get_cache_sizes(self) -> dict:
+        return {
+            "profile": self.profile.name,
+            **get_cache_sizes(self),
+            "teams": len(team_cache),
+            "team_messages": len(message_cache),
+        }
 
     async def load_db(self) -> None:
         try:
-            create_db_and_tables()
+            await self.loop.run_in_executor(executor, create_db_and_tables)
         except:
             logger.error("Failed to create the database and tables")
             logger.debug(traceback.format_exc())
@@ -41,6 +73,23 @@ class ServantBot(commands.Bot):
                 logger.error(f"Failed to load extension {cog.__name__}\n{exception}")
                 logger.debug(traceback.format_exc())
 
+    async def sync_commands(self) -> None:
+        """
+        Sync the slash commands once per start, and only when they changed.
+        Set COMMAND_SYNC_FORCE=true to sync anyway, and DEV_GUILD_IDS to sync
+        to development guilds instead of globally.
+        """
+        force = os.getenv("COMMAND_SYNC_FORCE", "false").lower() == "true"
+        dev_guild_ids = [
+            int(guild_id)
+            for guild_id in os.getenv("DEV_GUILD_IDS", "").split(",")
+            if guild_id.strip()
+        ]
+        try:
+            await sync_tree(self.tree, dev_guild_ids, force)
+        except discord.HTTPException as e:
+            logger.error(f"Failed to sync the command tree: {e}")
+
     @tasks.loop(minutes=1.0)
     async def status_task(self) -> None:
         """
@@ -77,14 +126,51 @@ class ServantBot(commands.Bot):
         logger.info(f"Python version: {platform.python_version()}")
         logger.info(f"Running on: {platform.system()} {platform.release()} ({os.name})")
         logger.info("-------------------")
-        await self.load_cogs()
-        await self.load_db()
+        startup_timeline.stop("login")
+        if self.user is not None:
+            self.command_prefixes = tuple(
+                commands.when_mentioned_or(self.prefix)(self, None)
+            )
+        self.add_dynamic_items(TeamButton)
+        # commands only touch the database once the bot is ready, so they
+        # are loaded while the database is checked
+        with startup_timeline.phase("setup_hook"):
+            await asyncio.gather(self.load_commands(), self.load_data())
         self.status_task.start()
+        startup_timeline.start("gateway")
+
+    async def load_commands(self) -> None:
+        with startup_timeline.phase("load_cogs"):
+            await self.load_cogs()
+        with startup_timeline.phase("sync_commands"):
+            await self.sync_commands()
+
+    async def load_data(self) -> None:
+        with startup_timeline.phase("load_db"):
+            await self.load_db()
+        with startup_timeline.phase("warm_cache"):
+            await warm_cache()
+
+    async def login(self, token: str) -> None:
+        # setup_hook is called at the end of login
+        startup_timeline.start("login")
+        await super().login(token)
 
     async def on_ready(self) -> None:
-        logger.info("Sync starting...")
-        await self.tree.sync()
-        logger.info("Sync complete")
+        startup_timeline.stop("gateway")
+        startup_timeline.log()
+        logger.info(f"Cache sizes: {self.get_cache_sizes()}")
+
+    async def close(self) -> None:
+        await team_renderer.flush_all()
+        await scheduler.drain()
+        await super().close()
+        await close_cache()
+        logger.info(f"Cache sizes: {self.get_cache_sizes()}")
+        logger.info(f"Messages: {self.message_stats}")
+        logger.info(f"Outbound requests: {get_outbound_stats()}")
+        logger.info(f"Database pool: {get_pool_stats()}")
+        close_db()
 
     async def on_message(self, message: discord.Message) -> None:
         """
@@ -92,10 +178,31 @@ class ServantBot(commands.Bot):
 
         :param message: The message that was sent.
         """
+        self.message_stats.seen += 1
         if message.author == self.user or message.author.bot:
             return
+        if not self.may_be_command(message.content):
+            return
+        self.message_stats.dispatched += 1
         await self.process_commands(message)
 
+    def may_be_command(self, content: str) -> bool:
+        """
+        Cheap check whether a message starts with a prefix followed by the
+        name or alias of a command, so other messages skip `process_commands`.
+        """
+        prefixes = self.command_prefixes
+        if prefixes is None:
+            return True
+        if not content.startswith(prefixes):
+            return False
+        for prefix in prefixes:
+            if content.startswith(prefix):
+                name = content[len(prefix) :].split(maxsplit=1)
+                if name and name[0] in self.all_commands:
+                    return True
+        return False
+
     async def on_command_completion(self, context: Context) -> None:
         """
         The code in this event is executed every time a normal command has been *successfully* executed.
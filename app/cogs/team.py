@@ -1,15 +1,20 @@
 from typing import TYPE_CHECKING
 
+import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from ..common.logger import get_logger
-from ..core.database import get_session
+from ..core.database import run_in_session
 from ..core.error.team import TeamBaseError
-from ..core.team import controller, handler
+from ..core.team import cache, controller, handler, retention
+from ..core.team.lock import team_locks
+from ..core.team.render import team_renderer
+from ..core.team.snapshot import TeamSnapshot
 from ..core.team.view import (
     JoinTeamView,
     TeamControlView,
+    TeamDraftView,
     TeamInfoView,
     TeamJoinView,
     TeamLeftView,
@@ -27,6 +32,69 @@ logger = get_logger(__name__)
 class Team(commands.Cog, name="team"):
     def __init__(self, bot: "ServantBot") -> None:
         self.bot = bot
+        self.backfilled = False
+
+    async def cog_load(self) -> None:
+        self.prune_task.start()
+
+    async def cog_unload(self) -> None:
+        self.prune_task.cancel()
+
+    @tasks.loop(hours=1.0)
+    async def prune_task(self) -> None:
+        """
+        Archive expired teams and delete their raw rows.
+        """
+        try:
+            report = await run_in_session(retention.prune_teams)
+        except Exception as e:
+            # an error would stop the loop, retry at the next run instead
+            logger.error(f"Failed to prune expired teams: {e}")
+            return
+        logger.info(
+            f"pruned {report.teams} teams, {report.members} members and "
+            f"{report.histories} histories in {report.duration_ms:.1f}ms"
+        )
+
+    @prune_task.before_loop
+    async def before_prune_task(self) -> None:
+        await self.bot.wait_until_ready()
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        if self.backfilled:
+            return
+        self.backfilled = True
+        teams = await run_in_session(handler.get_unscoped_teams)
+        for team in teams:
+            channel = await controller.find_message_channel(
+                self.bot.guilds, team.message_id
+            )
+            if channel is None:
+                await run_in_session(handler.set_team_unresolved, team.id)
+                logger.warning(
+                    f"channel of team {team.name} (ID: {team.id}) not found, "
+                    "it won't be looked for again"
+                )
+                continue
+            team = await run_in_session(
+                handler.set_team_channel, team.id, channel.guild.id, channel.id
+            )
+            cache.team_cache.put(TeamSnapshot.of(team))
+            logger.info(f"backfilled team {team.name} (ID: {team.id}) to {channel.id}")
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(
+        self, payload: discord.RawMessageDeleteEvent
+    ) -> None:
+        controller.message_cache.remove(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ) -> None:
+        for message_id in payload.message_ids:
+            controller.message_cache.remove(message_id)
 
     @commands.guild_only()
     @commands.hybrid_group(name="team")
@@ -46,30 +114,26 @@ class Team(commands.Cog, name="team"):
     @team.command(name="start", description="새로운 팀 생성")
     @app_commands.describe(name="팀 이름")
     async def start(self, context: "Context", *, name: str) -> None:
-        with get_session() as session:
-            message_id = await controller.setup_embed(context, name)
-            team = await handler.create_team(session, message_id, name)
-            logger.info(f"created new team: {team.name} ({message_id})")
-            await handler.add_member(
-                session,
-                team,
-                context.author.id,
-                context.author.name,
-            )
-            message = await controller.fetch_message(context, team)
-            await controller.send_join_alert(
-                message,
-                team,
-                context.author.id,
-            )
-            await controller.update_team_message(
-                message,
-                team,
-                JoinTeamView(team),
-            )
-            logger.info(
-                f"{context.author.name} (ID: {context.author.id}) joined the team {team.name} (ID: {team.id})."
-            )
+        message_id = await controller.setup_embed(context, name)
+        team = await cache.start_team(
+            message_id,
+            name,
+            context.guild.id,
+            context.channel.id,
+            context.author.id,
+            context.author.name,
+        )
+        logger.info(f"created new team: {team.name} ({message_id})")
+        message = await controller.fetch_message(context, team)
+        team_renderer.render(
+            message,
+            team,
+            JoinTeamView(team.id),
+            joined=context.author.id,
+        )
+        logger.info(
+            f"{context.author.name} (ID: {context.author.id}) joined the team {team.name} (ID: {team.id})."
+        )
 
     @commands.guild_only()
     @commands.hybrid_command(
@@ -83,43 +147,39 @@ class Team(commands.Cog, name="team"):
     @commands.guild_only()
     @team.command(name="join", description="생성된 팀에 참가")
     async def join(self, context: "Context") -> None:
-        with get_session() as session:
-            teams = handler.get_team_list(session)
-            if len(teams) == 1:
-                team = teams[0]
-                await handler.add_member(
-                    session,
-                    team,
+        teams = await cache.get_team_list(context.guild.id)
+        if len(teams) == 1:
+            team = teams[0]
+            await controller.defer_command(context, ephemeral=True)
+            async with team_locks.hold(team.id):
+                team = await cache.add_member(
+                    team.id,
                     context.author.id,
                     context.author.name,
                 )
                 message = await controller.fetch_message(context.channel, team)
-                await controller.send_join_alert(
-                    message,
-                    team,
-                    context.author.id,
-                )
-                await controller.update_team_message(
+                team_renderer.render(
                     message,
                     team,
-                    JoinTeamView(team),
-                )
-                logger.info(
-                    f"{context.author.name} (ID: {context.author.id}) joined the team {team.name} (ID: {team.id})."
-                )
-                await context.send(
-                    f"{team.name} 팀에 참가했어요.",
-                    ephemeral=True,
-                    delete_after=3,
-                )
-            else:
-                view = TeamJoinView(teams)
-                await context.send(
-                    "참가하려는 팀을 선택해 주세요.",
-                    view=view,
-                    ephemeral=True,
-                    delete_after=10,
+                    JoinTeamView(team.id),
+                    joined=context.author.id,
                 )
+            logger.info(
+                f"{context.author.name} (ID: {context.author.id}) joined the team {team.name} (ID: {team.id})."
+            )
+            await context.send(
+                f"{team.name} 팀에 참가했어요.",
+                ephemeral=True,
+                delete_after=3,
+            )
+        else:
+            view = TeamJoinView(teams)
+            await context.send(
+                "참가하려는 팀을 선택해 주세요.",
+                view=view,
+                ephemeral=True,
+                delete_after=10,
+            )
 
     @commands.guild_only()
     @commands.hybrid_command(
@@ -133,43 +193,39 @@ class Team(commands.Cog, name="team"):
     @commands.guild_only()
     @team.command(name="cancel", description="팀 참가 취소")
     async def cancel_join(self, context: "Context") -> None:
-        with get_session() as session:
-            teams = handler.get_team_list(session)
-            if len(teams) == 1:
-                team = teams[0]
-                await handler.remove_member(
-                    session,
-                    team,
+        teams = await cache.get_team_list(context.guild.id)
+        if len(teams) == 1:
+            team = teams[0]
+            await controller.defer_command(context, ephemeral=True)
+            async with team_locks.hold(team.id):
+                team = await cache.remove_member(
+                    team.id,
                     context.author.id,
                     context.author.name,
                 )
                 message = await controller.fetch_message(context.channel, team)
-                await controller.send_left_alert(
-                    message,
-                    team,
-                    context.author.id,
-                )
-                await controller.update_team_message(
+                team_renderer.render(
                     message,
                     team,
-                    JoinTeamView(team),
-                )
-                logger.info(
-                    f"{context.author.name} (ID: {context.author.id}) left the team {team.name} (ID: {team.id})."
-                )
-                await context.send(
-                    f"{team.name} 팀에서 나갔어요.",
-                    ephemeral=True,
-                    delete_after=3,
-                )
-            else:
-                view = TeamLeftView(teams)
-                await context.send(
-                    "나가려는 팀을 선택해 주세요.",
-                    view=view,
-                    ephemeral=True,
-                    delete_after=10,
+                    JoinTeamView(team.id),
+                    left=context.author.id,
                 )
+            logger.info(
+                f"{context.author.name} (ID: {context.author.id}) left the team {team.name} (ID: {team.id})."
+            )
+            await context.send(
+                f"{team.name} 팀에서 나갔어요.",
+                ephemeral=True,
+                delete_after=3,
+            )
+        else:
+            view = TeamLeftView(teams)
+            await context.send(
+                "나가려는 팀을 선택해 주세요.",
+                view=view,
+                ephemeral=True,
+                delete_after=10,
+            )
 
     @commands.guild_only()
     @commands.hybrid_command(
@@ -183,19 +239,16 @@ class Team(commands.Cog, name="team"):
     @commands.guild_only()
     @team.command(name="info", description="팀 확인")
     async def info(self, context: "Context") -> None:
-        with get_session() as session:
-            teams = handler.get_team_list(session)
-            if len(teams) == 1:
-                team = teams[0]
-                with get_session() as session:
-                    message = await controller.fetch_message(context.channel, team)
-                    await controller.show_team_detail(message, team)
-                    view = TeamControlView(team)
-                    await context.send(
-                        f"**{team.name}**팀 메뉴", view=view, ephemeral=True
-                    )
-            else:
-                await controller.show_team_list(context, teams, TeamInfoView(teams))
+        teams = await cache.get_team_list(context.guild.id)
+        if len(teams) == 1:
+            team = teams[0]
+            await controller.defer_command(context, ephemeral=True)
+            message = await controller.fetch_message(context.channel, team)
+            await controller.show_team_detail(message, team)
+            view = TeamControlView(team.id)
+            await context.send(f"**{team.name}**팀 메뉴", view=view, ephemeral=True)
+        else:
+            await controller.show_team_list(context, teams, TeamInfoView(teams))
 
     @commands.guild_only()
     @commands.hybrid_command(
@@ -209,31 +262,82 @@ class Team(commands.Cog, name="team"):
     @commands.guild_only()
     @team.command(name="shuffle", description="랜덤 팀 생성")
     async def shuffle(self, context: "Context") -> None:
-        with get_session() as session:
-            teams = handler.get_team_list(session)
-            if len(teams) == 1:
-                team = teams[0]
-                message = await controller.fetch_message(context.channel, team)
-                members = team.members
-
-                team_idx = await handler.get_random_team(session, team)
-                if len(members) == 5:
-                    await controller.send_rank_team(message, team, team_idx)
-                else:
-                    await controller.send_custom_team(message, team, team_idx)
-                await context.send(
-                    f"{team.name} 팀을 섞었어요.",
-                    ephemeral=True,
-                    delete_after=3,
-                )
+        teams = await cache.get_team_list(context.guild.id)
+        if len(teams) == 1:
+            team = teams[0]
+            await controller.defer_command(context, ephemeral=True)
+            message = await controller.fetch_message(context.channel, team)
+
+            team, team_idx = await cache.get_random_team(team.id)
+            if len(team.members) == handler.LANE_COUNT:
+                await controller.send_rank_team(message, team, team_idx)
             else:
-                view = TeamShuffleView(teams)
-                await context.send(
-                    "참가하려는 팀을 선택해 주세요.",
-                    view=view,
-                    ephemeral=True,
-                    delete_after=10,
-                )
+                await controller.send_custom_team(message, team, team_idx)
+            await context.send(
+                f"{team.name} 팀을 섞었어요.",
+                ephemeral=True,
+                delete_after=3,
+            )
+        else:
+            view = TeamShuffleView(teams)
+            await context.send(
+                "참가하려는 팀을 선택해 주세요.",
+                view=view,
+                ephemeral=True,
+                delete_after=10,
+            )
+
+    @commands.guild_only()
+    @commands.hybrid_command(
+        name="d",
+        description="alias of /team draft",
+        aliases=["ㄷ", "드", "드래프트"],
+    )
+    async def alias_draft(self, context: "Context") -> None:
+        await self.draft(context)
+
+    @commands.guild_only()
+    @team.command(name="draft", description="여러 로비로 팀 나누기")
+    async def draft(self, context: "Context") -> None:
+        teams = await cache.get_team_list(context.guild.id)
+        if len(teams) == 1:
+            team = teams[0]
+            await controller.defer_command(context, ephemeral=True)
+            message = await controller.fetch_message(context.channel, team)
+
+            team, ratings, lane_weights = await cache.get_draft_team(team.id)
+            lobbies, with_lane = await handler.draft(ratings, lane_weights)
+            await controller.send_draft_team(message, team, lobbies, with_lane)
+            await context.send(
+                f"{team.name} 팀을 {len(lobbies)}개 로비로 나눴어요.",
+                ephemeral=True,
+                delete_after=3,
+            )
+        else:
+            view = TeamDraftView(teams)
+            await context.send(
+                "나누려는 팀을 선택해 주세요.",
+                view=view,
+                ephemeral=True,
+                delete_after=10,
+            )
+
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    @team.command(name="rating", description="팀 밸런스 점수 설정")
+    @app_commands.describe(user="점수를 설정할 유저", rating="점수")
+    async def rating(
+        self, context: "Context", user: discord.Member, rating: int
+    ) -> None:
+        await run_in_session(handler.set_rating, context.guild.id, user.id, rating)
+        logger.info(
+            f"{context.author.name} (ID: {context.author.id}) set the rating of {user.name} (ID: {user.id}) to {rating}."
+        )
+        await context.send(
+            f"<@{user.id}>님의 점수를 **{rating}**점으로 설정했어요.",
+            ephemeral=True,
+            delete_after=3,
+        )
 
     @commands.Cog.listener()
     async def on_command_error(self, context: "Context", error) -> None:
@@ -242,5 +346,10 @@ class Team(commands.Cog, name="team"):
                 embed = error.get_embed()
                 await context.send(embed=embed, ephemeral=True)
             logger.warning(f"{context.author} (ID: {context.author.id}) raised {error}")
+        elif isinstance(error, commands.MissingPermissions):
+            await context.send(
+                "이 명령어를 사용할 권한이 없어요.", ephemeral=True, delete_after=3
+            )
+            logger.warning(f"{context.author} (ID: {context.author.id}) raised {error}")
         elif isinstance(error, commands.errors.CommandError):
             logger.error(f"{context.author} (ID: {context.author.id}) raised {error}")
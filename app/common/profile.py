@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import discord
+
+if TYPE_CHECKING:
+    from discord.ext.commands import Bot
+
+
+@dataclass(frozen=True)
+class GatewayProfile:
+    """
+    What the bot subscribes to on the gateway and keeps in memory.
+    """
+
+    name: str
+    intents: discord.Intents
+    member_cache_flags: discord.MemberCacheFlags
+    chunk_guilds_at_startup: bool
+    # size of discord.py's message cache, team messages have their own cache
+    max_messages: int | None
+
+
+def minimal_profile() -> GatewayProfile:
+    """
+    Slash commands and buttons only, no member list and no message content.
+    """
+    intents = discord.Intents.none()
+    intents.guilds = True
+    return GatewayProfile(
+        name="minimal",
+        intents=intents,
+        member_cache_flags=discord.MemberCacheFlags.none(),
+        chunk_guilds_at_startup=False,
+        max_messages=None,
+    )
+
+
+def team_profile() -> GatewayProfile:
+    """
+    Team commands, including prefix commands. They only need the author of
+    each command, so no member is cached beyond the bot itself.
+    """
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return GatewayProfile(
+        name="team",
+        intents=intents,
+        member_cache_flags=discord.MemberCacheFlags.none(),
+        chunk_guilds_at_startup=False,
+        max_messages=None,
+    )
+
+
+def monitor_profile() -> GatewayProfile:
+    """
+    Everything, for presence monitoring: full member lists and presences.
+    Needs the members and presences privileged intents.
+    """
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True
+    intents.presences = True
+    return GatewayProfile(
+        name="monitor",
+        intents=intents,
+        member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+        chunk_guilds_at_startup=True,
+        max_messages=1000,
+    )
+
+
+PROFILES = {
+    "minimal": minimal_profile,
+    "team": team_profile,
+    "monitor": monitor_profile,
+}
+
+
+def get_profile(name: str) -> GatewayProfile:
+    if name not in PROFILES:
+        raise ValueError(
+            f"Unknown gateway profile '{name}'. Use one of {', '.join(PROFILES)}."
+        )
+    return PROFILES[name]()
+
+
+def get_cache_sizes(bot: "Bot") -> dict:
+    """
+    Number of objects discord.py keeps in memory.
+    """
+    return {
+        "guilds": len(bot.guilds),
+        "channels": sum(len(guild.channels) for guild in bot.guilds),
+        "members": sum(len(guild.members) for guild in bot.guilds),
+        "users": len(bot.users),
+        "messages": len(bot.cached_messages),
+        "emojis": len(bot.emojis),
+    }
@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Generator
+
+from .logger import get_logger
+
+
+@dataclass
+class Phase:
+    name: str
+    # seconds since the timeline started
+    start: float
+    end: float | None = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or self.start) - self.start
+
+
+class StartupTimeline:
+    """
+    Start and end of every startup phase, relative to when this module was
+    first imported. Phases may overlap when they run concurrently.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: dict[str, Phase] = {}
+        self.logged = False
+
+    def _now(self) -> float:
+        return time.perf_counter() - self.started
+
+    def start(self, name: str, at: float | None = None) -> None:
+        """
+        :param at: `time.perf_counter()` the phase started at, if not now.
+        """
+        start = self._now() if at is None else at - self.started
+        self.phases[name] = Phase(name, start)
+
+    def stop(self, name: str) -> None:
+        phase = self.phases.get(name)
+        if phase is not None and phase.end is None:
+            phase.end = self._now()
+
+    @contextmanager
+    def phase(self, name: str) -> Generator[None, None, None]:
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def log(self) -> None:
+        """
+        Log the timeline once, at the first ready event.
+        """
+        if self.logged:
+            return
+        self.logged = True
+        lines = [f"Startup timeline ({self._now() * 1000:.0f}ms to ready)"]
+        for phase in sorted(self.phases.values(), key=lambda phase: phase.start):
+            lines.append(
+                f"  {phase.name:<16} {phase.start * 1000:>8.1f}ms"
+                f" +{phase.duration * 1000:>8.1f}ms"
+            )
+        # the logger is created late so it picks up LOG_LEVEL from .env
+        get_logger(__name__).info("\n".join(lines))
+
+
+startup_timeline = StartupTimeline()
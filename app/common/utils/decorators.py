@@ -1,13 +1,22 @@
 from functools import wraps
 
-from ...core.database import get_session
+from ...core.database import run_in_session
 
 
 def with_session(func):
+    """
+    Run a blocking function as one unit of work in the database thread pool.
+
+    The function gets the session as its `session` keyword argument and is
+    committed once when it returns, or rolled back when it raises. Calls of
+    several handlers in it share one transaction.
+    """
+
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        with get_session() as session:
-            kwargs["session"] = session
-            return await func(*args, **kwargs)
+        def call(session):
+            return func(*args, session=session, **kwargs)
+
+        return await run_in_session(call)
 
     return wrapper
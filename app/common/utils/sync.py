@@ -0,0 +1,74 @@
+import json
+import os
+
+import discord
+from discord import app_commands
+
+from ..logger import get_logger
+from .hash import generate_key
+
+logger = get_logger(__name__)
+
+_sync_file = os.getenv("COMMAND_SYNC_FILE", ".command_sync.json")
+
+GLOBAL_SCOPE = "global"
+
+
+def get_tree_hash(
+    tree: app_commands.CommandTree, guild: discord.Object | None = None
+) -> str:
+    """
+    Stable hash of the commands of the tree as they are sent to Discord.
+    """
+    commands = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command["type"], command["name"]),
+    )
+    return generate_key(json.dumps(commands, sort_keys=True), 64)
+
+
+def load_sync_hashes() -> dict[str, str]:
+    if not os.path.exists(_sync_file):
+        return {}
+    try:
+        with open(_sync_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logger.warning(f"Failed to read {_sync_file}, syncing every command tree")
+        return {}
+
+
+def save_sync_hashes(hashes: dict[str, str]) -> None:
+    with open(_sync_file, "w") as f:
+        json.dump(hashes, f, indent=4)
+
+
+async def sync_tree(
+    tree: app_commands.CommandTree, guild_ids: list[int], force: bool = False
+) -> list[str]:
+    """
+    Sync the command tree only when it changed since the last sync.
+
+    :param guild_ids: Development guilds. When given, the global commands are
+        copied to and synced in these guilds only, which takes effect at once.
+    :param force: Sync even when the hash did not change.
+    :return: Synced scopes.
+    """
+    guilds = [discord.Object(id=guild_id) for guild_id in guild_ids]
+    for guild in guilds:
+        tree.copy_global_to(guild=guild)
+    scopes = {str(guild.id): guild for guild in guilds} or {GLOBAL_SCOPE: None}
+
+    hashes = load_sync_hashes()
+    synced = []
+    for scope, guild in scopes.items():
+        tree_hash = get_tree_hash(tree, guild)
+        if not force and hashes.get(scope) == tree_hash:
+            logger.info(f"Command tree of {scope} is up to date, skipping sync")
+            continue
+        commands = await tree.sync(guild=guild)
+        logger.info(f"Synced {len(commands)} commands to {scope}")
+        hashes[scope] = tree_hash
+        save_sync_hashes(hashes)
+        synced.append(scope)
+    return synced
@@ -1,9 +1,19 @@
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Generator
+from functools import partial
+from typing import Callable, Concatenate, Generator, ParamSpec, TypeVar
 
+from sqlalchemy import Engine, event
 from sqlmodel import Session, SQLModel, create_engine
 
+from .pool import get_pool_stats, postgres_pool_options, record_acquire, setup_pool
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
 database_type = os.getenv("DATABASE_TYPE", "sqlite")
 
 if database_type == "sqlite":
@@ -18,16 +28,111 @@ elif database_type == "postgresql":
     postgres_host = os.getenv("POSTGRES_HOST", "localhost")
     postgres_port = os.getenv("POSTGRES_PORT", "5432")
     postgres_url = f"postgresql://{postgres_user}:{postgres_password}@{postgres_host}:{postgres_port}/{postgres_db}"
-    engine = create_engine(postgres_url)
+    engine = create_engine(postgres_url, **postgres_pool_options())
 else:
     raise ValueError("Unsupported database type. Use 'sqlite' or 'postgresql'.")
 
+setup_pool(engine)
+
+# blocking session work runs here so it never holds the event loop
+executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DATABASE_WORKERS", "4")),
+    thread_name_prefix="database",
+)
+
 
 def create_db_and_tables():
+    from .migration import run_migrations
+
     SQLModel.metadata.create_all(engine)
+    return run_migrations(engine)
 
 
 @contextmanager
 def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
+
+
+def _run_in_session(func: Callable[..., T], *args, **kwargs) -> T:
+    with Session(engine, expire_on_commit=False) as session:
+        started = time.perf_counter()
+        session.connection()
+        record_acquire(started)
+        try:
+            result = func(session, *args, **kwargs)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return result
+
+
+async def run_in_session(
+    func: Callable[Concatenate[Session, P], T], *args: P.args, **kwargs: P.kwargs
+) -> T:
+    """
+    Run a blocking function with a new session in the database thread pool.
+
+    The call is one unit of work: whatever `func` adds or changes is committed
+    once after it returns, and rolled back when it raises (e.g. `TeamError`).
+    The session does not expire its objects on commit, so what `func` loaded
+    is still readable once the session is closed.
+
+    :param func: Function taking the session as its first argument.
+    :return: The return value of `func`.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, partial(_run_in_session, func, *args, **kwargs)
+    )
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(bind: Engine | None = None) -> Generator[QueryCounter, None, None]:
+    """
+    Record every statement sent through the engine, from any thread, while
+    the block runs.
+
+        with count_queries() as counter:
+            handler.get_team_list(session, guild_id)
+        assert counter.count <= 2, counter.statements
+    """
+    bind = bind or engine
+    counter = QueryCounter()
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        counter.statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(
+    limit: int, bind: Engine | None = None
+) -> Generator[QueryCounter, None, None]:
+    with count_queries(bind) as counter:
+        yield counter
+    if counter.count > limit:
+        raise AssertionError(
+            f"expected at most {limit} queries, got {counter.count}:\n"
+            + "\n".join(counter.statements)
+        )
+
+
+def close_db() -> None:
+    executor.shutdown(wait=True)
+    engine.dispose()
@@ -0,0 +1,149 @@
+import json
+import time
+from typing import Callable
+
+from sqlalchemy import Engine, bindparam, func, inspect, select, text
+from sqlmodel import Session
+
+from ...common.logger import get_logger
+from ..model.monitor import TargetState
+from ..model.schema import SchemaMigration
+from ..model.team import Member, Team, TeamHistory
+
+logger = get_logger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def run_migrations(engine: Engine) -> list[SchemaMigration]:
+    """
+    Apply every migration newer than the recorded schema version, in order.
+    Every migration is also safe on a database freshly built by `create_all`.
+
+    :return: The migrations applied by this run.
+    """
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    with Session(engine) as session:
+        applied = set(session.exec(select(SchemaMigration.version)).scalars().all())
+
+    started = time.perf_counter()
+    done: list[SchemaMigration] = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migration_started = time.perf_counter()
+        migrate(engine)
+        migration = SchemaMigration(
+            version=version,
+            name=name,
+            duration_ms=(time.perf_counter() - migration_started) * 1000,
+        )
+        with Session(engine) as session:
+            session.add(migration)
+            session.commit()
+            session.refresh(migration)
+        logger.info(
+            f"applied migration {version} ({name}) in {migration.duration_ms:.1f}ms"
+        )
+        done.append(migration)
+
+    logger.info(
+        f"schema is at version {MIGRATIONS[-1][0]}, "
+        f"{len(done)} migrations applied in {(time.perf_counter() - started) * 1000:.1f}ms"
+    )
+    return done
+
+
+def add_team_scope_columns(engine: Engine) -> None:
+    """
+    `create_all` never alters an existing table, so nullable columns added to
+    a model later are added here.
+    """
+    table = Team.__table__
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            connection.execute(
+                text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            )
+            logger.info(f"added column {table.name}.{column.name}")
+
+
+def remove_duplicate_members(engine: Engine) -> None:
+    """
+    Keep the first row of every (team, user) pair so the unique index on
+    members can be created.
+    """
+    table = Member.__table__
+    first = select(func.min(table.c.id)).group_by(table.c.team_id, table.c.discord_id)
+    with engine.begin() as connection:
+        result = connection.execute(table.delete().where(table.c.id.not_in(first)))
+    if result.rowcount:
+        logger.info(f"removed {result.rowcount} duplicate members")
+
+
+def create_missing_indexes(engine: Engine) -> None:
+    """
+    `create_all` only builds indexes together with a new table, so indexes
+    added to an existing table have to be created here.
+    """
+    for table in (
+        Team.__table__,
+        Member.__table__,
+        TeamHistory.__table__,
+        TargetState.__table__,
+    ):
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def migrate_history_numbers(engine: Engine, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Convert the histories still stored as a JSON list to the fixed width
+    encoding of `TeamHistory.encode`, one batch per transaction.
+
+    :return: Number of converted histories.
+    """
+    table = TeamHistory.__table__
+    query = (
+        select(table.c.id, table.c.numbers)
+        .where(table.c.numbers.like("[%"))
+        .limit(batch_size)
+    )
+    update = (
+        table.update()
+        .where(table.c.id == bindparam("history_id"))
+        .values(numbers=bindparam("encoded"))
+    )
+    converted = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(query).all()
+            if not rows:
+                break
+            connection.execute(
+                update,
+                [
+                    {
+                        "history_id": history_id,
+                        "encoded": TeamHistory.encode(json.loads(numbers)),
+                    }
+                    for history_id, numbers in rows
+                ],
+            )
+        converted += len(rows)
+    if converted:
+        logger.info(f"converted {converted} team histories to the fixed width format")
+    return converted
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "add team guild and channel", add_team_scope_columns),
+    (2, "encode team history numbers", migrate_history_numbers),
+    (3, "remove duplicate members", remove_duplicate_members),
+    (4, "create indexes", create_missing_indexes),
+    (5, "add team unresolved_at", add_team_scope_columns),
+]
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import Engine, event
+from sqlalchemy.pool import QueuePool
+
+from ...common.logger import get_logger
+
+logger = get_logger(__name__)
+
+ACQUIRE_WARN_MS = float(os.getenv("DATABASE_ACQUIRE_WARN_MS", "100"))
+
+
+@dataclass
+class PoolStats:
+    size: int = 0
+    checked_out: int = 0
+    overflow: int = 0
+    connects: int = 0
+    checkouts: int = 0
+    acquires: int = 0
+    invalidations: int = 0
+    slow_acquires: int = 0
+    wait_total_ms: float = 0.0
+    wait_max_ms: float = 0.0
+
+    @property
+    def wait_avg_ms(self) -> float:
+        return self.wait_total_ms / self.acquires if self.acquires else 0.0
+
+
+_stats = PoolStats()
+# the counters are updated from the database worker threads
+_stats_lock = threading.Lock()
+_engine: Engine | None = None
+
+
+def postgres_pool_options() -> dict:
+    return {
+        "pool_size": int(os.getenv("DATABASE_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DATABASE_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DATABASE_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DATABASE_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true",
+    }
+
+
+def setup_sqlite_pragmas(engine: Engine) -> None:
+    pragmas = {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+    }
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for key, value in pragmas.items():
+            cursor.execute(f"PRAGMA {key}={value}")
+        cursor.close()
+
+
+def setup_pool_events(engine: Engine) -> None:
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        with _stats_lock:
+            _stats.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with _stats_lock:
+            _stats.checkouts += 1
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        with _stats_lock:
+            _stats.invalidations += 1
+        logger.warning(f"database connection invalidated: {exception}")
+
+
+def record_acquire(started: float) -> None:
+    """
+    Record how long it took to get a connection from the pool.
+
+    :param started: `time.perf_counter()` before the connection was requested.
+    """
+    wait_ms = (time.perf_counter() - started) * 1000
+    slow = wait_ms >= ACQUIRE_WARN_MS
+    with _stats_lock:
+        _stats.acquires += 1
+        _stats.wait_total_ms += wait_ms
+        _stats.wait_max_ms = max(_stats.wait_max_ms, wait_ms)
+        if slow:
+            _stats.slow_acquires += 1
+    if slow:
+        logger.warning(
+            f"waited {wait_ms:.1f}ms for a database connection ({get_pool_stats()})"
+        )
+
+
+def setup_pool(engine: Engine) -> None:
+    global _engine
+    _engine = engine
+    setup_pool_events(engine)
+    if engine.dialect.name == "sqlite":
+        setup_sqlite_pragmas(engine)
+
+
+def get_pool_stats() -> dict:
+    with _stats_lock:
+        if _engine is not None and isinstance(_engine.pool, QueuePool):
+            _stats.size = _engine.pool.size()
+            _stats.checked_out = _engine.pool.checkedout()
+            _stats.overflow = max(_engine.pool.overflow(), 0)
+        stats = asdict(_stats)
+        stats["wait_avg_ms"] = _stats.wait_avg_ms
+    return stats
@@ -39,3 +39,7 @@ class TeamError(TeamBaseError):
             color=Colors.ERROR,
         )
         return embed
+
+
+class TeamNotFoundError(TeamError):
+    pass
@@ -24,5 +24,5 @@ class TargetState(SQLModel, table=True):
     end_time: datetime | None
     alerted: bool = False
 
-    target_id: int = Field(foreign_key="target.id")
+    target_id: int = Field(foreign_key="target.id", index=True)
     target: Target = Relationship(back_populates="states")
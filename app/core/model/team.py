@@ -1,34 +1,110 @@
 from datetime import datetime
+from typing import Optional
 
-from sqlalchemy import BigInteger, Column
+from sqlalchemy import BigInteger, Column, Index
 from sqlmodel import Field, Relationship, SQLModel
 
 
 class Team(SQLModel, table=True):
+    __table_args__ = (Index("ix_team_guild_id_created_at", "guild_id", "created_at"),)
+
     id: int | None = Field(default=None, primary_key=True)
     name: str
     message_id: int = Field(sa_column=Column(BigInteger()))
-    members: list["Member"] = Relationship(back_populates="team", cascade_delete=True)
+    guild_id: int | None = Field(default=None, sa_column=Column(BigInteger()))
+    channel_id: int | None = Field(default=None, sa_column=Column(BigInteger()))
+    # member indices are stored in histories and weights, so keep join order
+    members: list["Member"] = Relationship(
+        back_populates="team",
+        cascade_delete=True,
+        sa_relationship_kwargs={"order_by": "Member.id"},
+    )
     histories: list["TeamHistory"] = Relationship(
         back_populates="team", cascade_delete=True
     )
+    weight: Optional["TeamWeight"] = Relationship(
+        back_populates="team", cascade_delete=True
+    )
     always_active: bool = False
-    created_at: datetime = Field(default_factory=lambda: datetime.now())
+    created_at: datetime = Field(default_factory=lambda: datetime.now(), index=True)
+    # set when the channel of a team created before teams were scoped to a
+    # guild was not found, so it is not looked for again at every start
+    unresolved_at: datetime | None = None
 
 
 class Member(SQLModel, table=True):
+    __table_args__ = (
+        Index("uq_member_team_id_discord_id", "team_id", "discord_id", unique=True),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     discord_id: int = Field(sa_column=Column(BigInteger()))
     name: str
 
-    team_id: int = Field(foreign_key="team.id")
+    team_id: int = Field(foreign_key="team.id", index=True)
     team: Team = Relationship(back_populates="members")
 
 
 class TeamHistory(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    # member index of every lane, one digit per lane (e.g. "30142")
     numbers: str
     created_at: datetime = Field(default_factory=lambda: datetime.now())
 
-    team_id: int = Field(foreign_key="team.id")
+    team_id: int = Field(foreign_key="team.id", index=True)
     team: Team = Relationship(back_populates="histories")
+
+    @staticmethod
+    def encode(record: list[int]) -> str:
+        return "".join(str(member_no) for member_no in record)
+
+    @staticmethod
+    def decode(numbers: str) -> list[int]:
+        return [int(member_no) for member_no in numbers]
+
+
+class TeamWeight(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    weights: str
+    updated_at: datetime = Field(default_factory=lambda: datetime.now())
+
+    team_id: int = Field(foreign_key="team.id", unique=True)
+    team: Team = Relationship(back_populates="weight")
+
+
+class Rating(SQLModel, table=True):
+    __table_args__ = (
+        Index("uq_rating_guild_id_discord_id", "guild_id", "discord_id", unique=True),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    # a rating only balances the teams of the guild it was set in
+    guild_id: int | None = Field(default=None, sa_column=Column(BigInteger()))
+    discord_id: int = Field(sa_column=Column(BigInteger()))
+    rating: int
+    updated_at: datetime = Field(default_factory=lambda: datetime.now())
+
+
+class TeamSummary(SQLModel, table=True):
+    """
+    What is left of a member of a team after the team is archived.
+    """
+
+    __table_args__ = (
+        Index(
+            "uq_team_summary_team_id_discord_id", "team_id", "discord_id", unique=True
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    # id of the archived team, which no longer exists
+    team_id: int = Field(index=True)
+    team_name: str
+    guild_id: int | None = Field(default=None, sa_column=Column(BigInteger()))
+    discord_id: int = Field(sa_column=Column(BigInteger(), index=True))
+    name: str
+    # times played on each lane, one number per lane separated by commas
+    lane_counts: str
+    games: int = 0
+    team_created_at: datetime
+    archived_at: datetime = Field(default_factory=lambda: datetime.now())
@@ -0,0 +1,196 @@
+import random
+from bisect import bisect_left, bisect_right
+
+BALANCE_TOLERANCE = 50.0
+# larger teams are split by local search, the exact split grows as 2^(n/2)
+EXACT_SPLIT_LIMIT = 24
+LOCAL_SEARCH_ROUNDS = 8
+
+
+def _subset_sums(ratings: list[float], offset: int) -> list[list[tuple[float, int]]]:
+    """
+    Every subset of `ratings` as `(sum, bitmask)`, grouped by subset size.
+    Bit `i` of the mask stands for the member `offset + i`.
+    """
+    subsets: list[list[tuple[float, int]]] = [[(0.0, 0)]]
+    for idx, rating in enumerate(ratings):
+        bit = 1 << (offset + idx)
+        subsets.append([])
+        for size in range(len(subsets) - 2, -1, -1):
+            subsets[size + 1].extend(
+                (total + rating, mask | bit) for total, mask in subsets[size]
+            )
+    for group in subsets:
+        group.sort()
+    return subsets
+
+
+def split_teams(
+    ratings: list[float], tolerance: float = BALANCE_TOLERANCE
+) -> list[int]:
+    """
+    Split the members into two sides with the smallest rating difference.
+
+    Meet-in-the-middle over the two halves of the member list, so it costs
+    about `2^(n/2)` subsets instead of `2^n`. A split is picked uniformly
+    among every split within `tolerance` of the best one.
+
+    Teams of more than `EXACT_SPLIT_LIMIT` members are split by
+    `_local_search_split` instead, which is not always optimal but bounded.
+
+    :param ratings: Rating of each member.
+    :param tolerance: Allowed rating difference over the best split.
+    :return: Member indices, the first `(n + 1) // 2` of them are the first side.
+    """
+    count = len(ratings)
+    if count > EXACT_SPLIT_LIMIT:
+        return _local_search_split(ratings, tolerance)
+    side_size = (count + 1) // 2
+    half = count // 2
+    total = sum(ratings)
+    left = _subset_sums(ratings[:half], 0)
+    right = _subset_sums(ratings[half:], half)
+    right_sums = [[value for value, _ in group] for group in right]
+
+    def pairs():
+        for size, group in enumerate(left):
+            other = side_size - size
+            if not 0 <= other < len(right):
+                continue
+            for left_sum, left_mask in group:
+                yield left_sum, left_mask, other
+
+    best = float("inf")
+    for left_sum, _, other in pairs():
+        sums = right_sums[other]
+        pos = bisect_left(sums, total / 2 - left_sum)
+        for near in (pos - 1, pos):
+            if 0 <= near < len(sums):
+                best = min(best, abs(total - 2 * (left_sum + sums[near])))
+
+    limit = best + tolerance + 1e-9
+    candidates: list[tuple[int, int, int, int]] = []
+    found = 0
+    for left_sum, left_mask, other in pairs():
+        sums = right_sums[other]
+        low = bisect_left(sums, (total - limit) / 2 - left_sum)
+        high = bisect_right(sums, (total + limit) / 2 - left_sum)
+        if low < high:
+            candidates.append((left_mask, other, low, high))
+            found += high - low
+
+    pick = random.randrange(found)
+    for left_mask, other, low, high in candidates:
+        if pick < high - low:
+            mask = left_mask | right[other][low + pick][1]
+            break
+        pick -= high - low
+
+    first = [idx for idx in range(count) if mask >> idx & 1]
+    second = [idx for idx in range(count) if not mask >> idx & 1]
+    random.shuffle(first)
+    random.shuffle(second)
+    return first + second
+
+
+def _local_search_split(
+    ratings: list[float], tolerance: float, rounds: int = LOCAL_SEARCH_ROUNDS
+) -> list[int]:
+    """
+    Split the members by swapping members between two sides as long as it
+    lowers the rating difference, starting from a greedy split and from
+    `rounds - 1` random ones. A split is picked uniformly among the results
+    within `tolerance` of the best one.
+    """
+    count = len(ratings)
+    side_size = (count + 1) // 2
+    results: list[tuple[float, list[int], list[int]]] = []
+    for round_no in range(rounds):
+        if round_no == 0:
+            first, second = _greedy_sides(ratings, side_size)
+        else:
+            order = random.sample(range(count), count)
+            first, second = order[:side_size], order[side_size:]
+        diff = _improve_by_swaps(ratings, first, second)
+        results.append((diff, first, second))
+
+    best = min(diff for diff, _, _ in results)
+    _, first, second = random.choice(
+        [result for result in results if result[0] <= best + tolerance + 1e-9]
+    )
+    first, second = first.copy(), second.copy()
+    random.shuffle(first)
+    random.shuffle(second)
+    return first + second
+
+
+def _greedy_sides(ratings: list[float], side_size: int) -> tuple[list[int], list[int]]:
+    """
+    Hand the members out from the highest rating, each to the side with the
+    lower total that still has room.
+    """
+    first: list[int] = []
+    second: list[int] = []
+    totals = [0.0, 0.0]
+    second_size = len(ratings) - side_size
+    order = sorted(
+        range(len(ratings)), key=lambda idx: (-ratings[idx], random.random())
+    )
+    for idx in order:
+        if len(second) >= second_size or (
+            len(first) < side_size and totals[0] <= totals[1]
+        ):
+            first.append(idx)
+            totals[0] += ratings[idx]
+        else:
+            second.append(idx)
+            totals[1] += ratings[idx]
+    return first, second
+
+
+def _improve_by_swaps(
+    ratings: list[float], first: list[int], second: list[int]
+) -> float:
+    """
+    Swap the pair of members that lowers the rating difference the most until
+    no swap does, in place.
+
+    :return: The rating difference of the sides.
+    """
+    diff = sum(ratings[idx] for idx in first) - sum(ratings[idx] for idx in second)
+    # every swap lowers the difference, so this only bounds float noise
+    for _ in range(len(ratings) ** 2):
+        best = abs(diff)
+        swap = None
+        for i, a in enumerate(first):
+            for j, b in enumerate(second):
+                swapped = abs(diff - 2 * (ratings[a] - ratings[b]))
+                if swapped < best - 1e-9:
+                    best = swapped
+                    swap = (i, j)
+        if swap is None:
+            break
+        i, j = swap
+        diff -= 2 * (ratings[first[i]] - ratings[second[j]])
+        first[i], second[j] = second[j], first[i]
+    return abs(diff)
+
+
+def draft_lobbies(ratings: list[float], lobby_size: int) -> list[list[int]]:
+    """
+    Partition the members into lobbies of at most `lobby_size` members and
+    split every lobby into two balanced sides.
+
+    :param ratings: Rating of each member.
+    :param lobby_size: Maximum number of members in a lobby.
+    :return: Member indices of each lobby, ordered like `split_teams`.
+    """
+    count = len(ratings)
+    lobby_count = -(-count // lobby_size)
+    order = list(range(count))
+    random.shuffle(order)
+    lobbies = [order[idx::lobby_count] for idx in range(lobby_count)]
+    return [
+        [lobby[idx] for idx in split_teams([ratings[m] for m in lobby])]
+        for lobby in lobbies
+    ]
@@ -0,0 +1,307 @@
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Generator
+
+from redis import RedisError
+from sqlmodel import Session
+
+from ...common.logger import get_logger
+from ...common.utils.decorators import with_session
+from ..database import run_in_session
+from ..error.team import TeamError, TeamNotFoundError
+from ..model.team import Team
+from . import handler
+from .lock import team_locks
+from .shared import create_shared_state
+from .snapshot import TeamSnapshot
+
+logger = get_logger(__name__)
+
+
+class TeamCache:
+    """
+    Active teams and their members of this process, indexed by guild.
+
+    Once warmed, it holds every team `handler.get_team_list` would return, so
+    team lists and lookups are served without a database round trip. Teams
+    expire together with their listing lifetime.
+    """
+
+    def __init__(self) -> None:
+        self.ready = False
+        self._teams: dict[int, TeamSnapshot] = {}
+        self._guilds: dict[int, set[int]] = {}
+
+    def warm(self, teams: list[TeamSnapshot]) -> None:
+        self._teams.clear()
+        self._guilds.clear()
+        for team in teams:
+            self.put(team)
+        self.ready = True
+
+    def put(self, team: TeamSnapshot) -> None:
+        if team.guild_id is None or self._expired(team):
+            return
+        self._teams[team.id] = team
+        self._guilds.setdefault(team.guild_id, set()).add(team.id)
+
+    def remove(self, team_id: int) -> None:
+        team = self._teams.pop(team_id, None)
+        if team is not None:
+            self._guilds.get(team.guild_id, set()).discard(team_id)
+
+    def get(self, team_id: int) -> TeamSnapshot | None:
+        team = self._teams.get(team_id)
+        if team is not None and self._expired(team):
+            self.remove(team_id)
+            return None
+        return team
+
+    def list(self, guild_id: int) -> list[TeamSnapshot]:
+        teams = [self.get(team_id) for team_id in list(self._guilds.get(guild_id, ()))]
+        return sorted(
+            [team for team in teams if team is not None],
+            key=lambda team: team.created_at,
+            reverse=True,
+        )
+
+    def __len__(self) -> int:
+        return len(self._teams)
+
+    @staticmethod
+    def _expired(team: TeamSnapshot) -> bool:
+        return team.created_at <= datetime.now() - handler.TEAM_LIFETIME
+
+
+team_cache = TeamCache()
+# set when REDIS_URL is configured, to share team state between processes
+shared_state = create_shared_state(int(handler.TEAM_LIFETIME.total_seconds()))
+# teams whose shared state this process failed to update
+_unsynced: set[int] = set()
+
+
+@contextmanager
+def _fallback(team_id: int | None = None) -> Generator[None, None, None]:
+    """
+    Ignore a failing shared state call, the database alone is used instead.
+
+    :param team_id: Team whose shared state may be stale after the failure.
+    """
+    try:
+        yield
+    except RedisError as e:
+        logger.warning(f"shared team state failed, using the database only: {e}")
+        if team_id is not None:
+            _unsynced.add(team_id)
+
+
+async def _synced(team_id: int) -> bool:
+    """
+    Drop the shared state of a team this process failed to update, so it is
+    seeded again from the database.
+
+    :return: Whether the shared state of the team may be used.
+    """
+    if shared_state is None:
+        return False
+    if team_id in _unsynced:
+        with _fallback(team_id):
+            await shared_state.drop(team_id)
+            _unsynced.discard(team_id)
+    return team_id not in _unsynced
+
+
+async def warm_cache() -> None:
+    teams = await run_in_session(_snapshots, handler.get_active_teams)
+    team_cache.warm(teams)
+    logger.info(f"Cached {len(team_cache)} active teams")
+    if shared_state is not None:
+        shared_state.start_listener(reload_team)
+
+
+async def reload_team(team_id: int) -> None:
+    """
+    Reload a team changed by another process.
+    """
+    async with team_locks.hold(team_id):
+        try:
+            team = await run_in_session(_snapshot, handler.get_team, team_id)
+        except TeamError:
+            team_cache.remove(team_id)
+            return
+        team_cache.put(team)
+
+
+def _snapshot(db: Session, func: Callable[..., Team], *args) -> TeamSnapshot:
+    """
+    Run a handler returning a team and snapshot the team in its session.
+    """
+    return TeamSnapshot.of(func(db, *args))
+
+
+def _snapshots(
+    db: Session, func: Callable[..., list[Team]], *args
+) -> list[TeamSnapshot]:
+    return [TeamSnapshot.of(team) for team in func(db, *args)]
+
+
+async def _changed(team: TeamSnapshot) -> None:
+    team_cache.put(team)
+    if shared_state is not None:
+        with _fallback(team.id):
+            await shared_state.seed(team)
+        with _fallback():
+            await shared_state.publish(team.id)
+
+
+async def get_team_list(guild_id: int) -> list[TeamSnapshot]:
+    if not team_cache.ready:
+        return await run_in_session(_snapshots, handler.get_team_list, guild_id)
+    teams = team_cache.list(guild_id)
+    if not teams:
+        raise handler.team_not_found()
+    return teams
+
+
+async def get_team(team_id: int) -> TeamSnapshot:
+    team = team_cache.get(team_id)
+    if team is None:
+        team = await run_in_session(_snapshot, handler.get_team, team_id)
+        team_cache.put(team)
+    return team
+
+
+@with_session
+def _start_team(
+    message_id: int,
+    name: str,
+    guild_id: int,
+    channel_id: int,
+    user_id: int,
+    user_name: str,
+    session: Session,
+) -> TeamSnapshot:
+    team = handler.create_team(session, message_id, name, guild_id, channel_id)
+    return TeamSnapshot.of(handler.add_member(session, team.id, user_id, user_name))
+
+
+async def start_team(
+    message_id: int,
+    name: str,
+    guild_id: int,
+    channel_id: int,
+    user_id: int,
+    user_name: str,
+) -> TeamSnapshot:
+    """
+    Create a team with its creator as the first member, in one transaction.
+    """
+    team = await _start_team(message_id, name, guild_id, channel_id, user_id, user_name)
+    await _changed(team)
+    return team
+
+
+async def add_member(team_id: int, user_id: int, user_name: str) -> TeamSnapshot:
+    if await _synced(team_id):
+        changed = None
+        with _fallback(team_id):
+            changed = await shared_state.add_member(team_id, user_id)
+        if changed == 0:
+            raise handler.already_joined(await get_team(team_id))
+    try:
+        team = await run_in_session(
+            _snapshot, handler.add_member, team_id, user_id, user_name
+        )
+    except Exception as e:
+        if isinstance(e, TeamNotFoundError):
+            team_cache.remove(team_id)
+        if shared_state is not None:
+            with _fallback(team_id):
+                await shared_state.drop(team_id)
+        raise
+    await _changed(team)
+    return team
+
+
+async def remove_member(team_id: int, user_id: int, user_name: str) -> TeamSnapshot:
+    if await _synced(team_id):
+        changed = None
+        with _fallback(team_id):
+            changed = await shared_state.remove_member(team_id, user_id)
+        if changed == 0:
+            raise handler.not_joined(await get_team(team_id))
+    try:
+        team = await run_in_session(
+            _snapshot, handler.remove_member, team_id, user_id, user_name
+        )
+    except Exception as e:
+        if isinstance(e, TeamNotFoundError):
+            team_cache.remove(team_id)
+        if shared_state is not None:
+            with _fallback(team_id):
+                await shared_state.drop(team_id)
+        raise
+    await _changed(team)
+    return team
+
+
+def _shuffle(
+    db: Session, team_id: int, weight: list[list[float]] | None
+) -> tuple[TeamSnapshot, list[int], list[list[float]] | None]:
+    team, team_idx, new_weight = handler.get_random_team(db, team_id, weight)
+    return TeamSnapshot.of(team), team_idx, new_weight
+
+
+async def get_random_team(team_id: int) -> tuple[TeamSnapshot, list[int]]:
+    """
+    With shared state, the lane weight is read from Redis and written back
+    with a keyed update, so the weight row is never loaded.
+    """
+    weight = None
+    if await _synced(team_id):
+        with _fallback(team_id):
+            weight = await shared_state.get_weight(team_id)
+    # a shuffle never changes the members, and putting its snapshot without
+    # the team lock could overwrite a newer one
+    team, team_idx, new_weight = await run_in_session(_shuffle, team_id, weight)
+    if shared_state is not None and new_weight is not None:
+        with _fallback(team_id):
+            await shared_state.set_weight(team_id, new_weight)
+    return team, team_idx
+
+
+def _draft_team(
+    db: Session, team_id: int
+) -> tuple[TeamSnapshot, list[float], list[list[float]]]:
+    team, ratings, lane_weights = handler.get_draft_team(db, team_id)
+    return TeamSnapshot.of(team), ratings, lane_weights
+
+
+async def get_draft_team(
+    team_id: int,
+) -> tuple[TeamSnapshot, list[float], list[list[float]]]:
+    return await run_in_session(_draft_team, team_id)
+
+
+async def delete_team(team_id: int) -> TeamSnapshot:
+    """
+    Must be called holding the team lock, so a concurrent join can't put the
+    deleted team back into the cache.
+    """
+    try:
+        team = await run_in_session(_snapshot, handler.delete_team, team_id)
+    finally:
+        team_cache.remove(team_id)
+        if shared_state is not None:
+            with _fallback(team_id):
+                await shared_state.drop(team_id)
+                _unsynced.discard(team_id)
+            with _fallback():
+                await shared_state.publish(team_id)
+    return team
+
+
+async def close_cache() -> None:
+    if shared_state is not None:
+        with _fallback():
+            await shared_state.close()
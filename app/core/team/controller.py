@@ -1,38 +1,148 @@
+import asyncio
+from collections import OrderedDict
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Awaitable, Callable, TypeVar
 
-from discord import Embed, NotFound, ui
+from discord import Embed, Forbidden, NotFound, ui, utils
 
 from ...common.utils.color import Colors
 from ..error.team import TeamError
-from ..model.team import Member, Team
+from . import cache
+from .outbound import DEADLINES, Priority, scheduler
+from .snapshot import MemberSnapshot, TeamSnapshot
 
 if TYPE_CHECKING:
-    from discord import Message
+    from discord import Guild, Interaction, Message
     from discord.abc import MessageableChannel
     from discord.ext.commands import Context
 
+T = TypeVar("T")
+
 TEAM_1_NAME = "팀 1"
 TEAM_2_NAME = "팀 2"
+LANE = ["탑", "정글", "미드", "원딜", "서폿"]
+MESSAGE_CACHE_SIZE = 256
+# total characters and number of the embeds of one message
+MAX_MESSAGE_EMBED_SIZE = 6000
+MAX_MESSAGE_EMBEDS = 10
+
+
+class MessageCache:
+    """
+    Recently used team messages by id, so replies and edits go out without
+    fetching the message first. Edits store the message they return, so the
+    embed held here stays the one shown in Discord.
+    """
+
+    def __init__(self, size: int = MESSAGE_CACHE_SIZE) -> None:
+        self.size = size
+        self._messages: OrderedDict[int, "Message"] = OrderedDict()
+
+    def get(self, message_id: int) -> "Message | None":
+        message = self._messages.get(message_id)
+        if message is not None:
+            self._messages.move_to_end(message_id)
+        return message
+
+    def put(self, message: "Message") -> None:
+        self._messages[message.id] = message
+        self._messages.move_to_end(message.id)
+        while len(self._messages) > self.size:
+            self._messages.popitem(last=False)
 
+    def remove(self, message_id: int) -> None:
+        self._messages.pop(message_id, None)
 
-async def fetch_message(channel: "MessageableChannel", team: Team) -> "Message":
-    message_id = team.message_id
-    not_found_error = TeamError(
+    def __len__(self) -> int:
+        return len(self._messages)
+
+
+message_cache = MessageCache()
+
+
+def message_not_found() -> TeamError:
+    return TeamError(
         "Team Create message is not found.",
         "팀을 찾을 수 없어요.",
         "**/q**로 팀을 새로 생성해 보세요.",
         alert=False,
     )
+
+
+async def acknowledge(
+    interaction: "Interaction", send: Callable[[], Awaitable[T]]
+) -> T:
+    """
+    Send the first response to an interaction ahead of every queued request.
+    """
+    # the 3 seconds to respond started when the interaction was created
+    age = (utils.utcnow() - interaction.created_at).total_seconds()
+    deadline = asyncio.get_running_loop().time() + DEADLINES[Priority.ACK] - age
+    return await scheduler.submit(
+        interaction.channel_id, Priority.ACK, send, deadline=deadline
+    )
+
+
+async def defer(interaction: "Interaction") -> None:
+    await acknowledge(interaction, interaction.response.defer)
+
+
+async def defer_command(context: "Context", ephemeral: bool = False) -> None:
+    """
+    Acknowledge the interaction of a slash command before doing its work, so
+    the command may answer later with `context.send`. Prefix commands have
+    nothing to acknowledge.
+    """
+    if context.interaction is not None:
+        await acknowledge(
+            context.interaction, lambda: context.defer(ephemeral=ephemeral)
+        )
+
+
+async def reply(message: "Message", priority: Priority, **kwargs) -> "Message | None":
+    return await scheduler.submit(
+        message.channel.id, priority, lambda: message.reply(**kwargs)
+    )
+
+
+async def fetch_message(channel: "MessageableChannel", team: TeamSnapshot) -> "Message":
+    message = message_cache.get(team.message_id)
+    if message is not None:
+        return message
+
+    # the team may have been created in another channel of the guild
+    guild = getattr(channel, "guild", None)
+    if guild is not None and team.channel_id is not None:
+        channel = guild.get_channel_or_thread(team.channel_id) or channel
     try:
-        message = await channel.fetch_message(message_id)
-    except NotFound as e:
-        raise not_found_error
+        message = await channel.fetch_message(team.message_id)
+    except NotFound:
+        raise message_not_found()
     if message.embeds == []:
-        raise not_found_error
+        raise message_not_found()
+    message_cache.put(message)
     return message
 
 
+async def find_message_channel(
+    guilds: "list[Guild]", message_id: int
+) -> "MessageableChannel | None":
+    """
+    Look for the channel of a message in every text channel the bot can read.
+    Slow, only meant to backfill teams created before the channel was stored.
+    """
+    for guild in guilds:
+        for channel in guild.text_channels:
+            if not channel.permissions_for(guild.me).read_message_history:
+                continue
+            try:
+                await channel.fetch_message(message_id)
+            except (NotFound, Forbidden):
+                continue
+            return channel
+    return None
+
+
 async def setup_embed(context: "Context", name: str) -> int:
     embed = Embed(
         title=f"{name} 팀이 구성되었어요.",
@@ -41,52 +151,71 @@ async def setup_embed(context: "Context", name: str) -> int:
     )
     embed.add_field(name=f"현제 인원: 0", value="")
     embed.set_footer(text="/s로 굴릴 수 있어요. /c로 팀 등록을 취소할 수 있어요.")
-    message = await context.send(embed=embed, silent=True)
-    return message.id
 
+    async def send() -> "Message":
+        return await context.send(embed=embed, silent=True)
 
-async def send_join_alert(
-    message: "Message",
-    team: Team,
-    user_id: int,
-):
-    embed = Embed(
-        description=f"<@{user_id}>님이 **{team.name}**팀에 참가했어요.",
-        color=Colors.BASE,
-    )
-    await message.reply(embed=embed)
+    if context.interaction is not None:
+        # the team message is the response of the slash command
+        message = await acknowledge(context.interaction, send)
+    else:
+        message = await scheduler.submit(context.channel.id, Priority.STATE, send)
+    message_cache.put(message)
+    return message.id
 
 
-async def send_left_alert(
+async def send_member_alert(
     message: "Message",
-    team: Team,
-    user_id: int,
+    team: TeamSnapshot,
+    joined: list[int],
+    left: list[int],
 ):
+    lines = []
+    if joined:
+        users = ", ".join([f"<@{user_id}>" for user_id in joined])
+        lines.append(f"{users}님이 **{team.name}**팀에 참가했어요.")
+    if left:
+        users = ", ".join([f"<@{user_id}>" for user_id in left])
+        lines.append(f"{users}님이 **{team.name}**팀에서 나갔어요.")
     embed = Embed(
-        description=f"<@{user_id}>님이 **{team.name}**팀에서 나갔어요.",
+        description="\n".join(lines),
         color=Colors.BASE,
     )
-    await message.reply(embed=embed)
+    await reply(message, Priority.ANNOUNCE, embed=embed)
 
 
 async def update_team_message(
     message: "Message",
-    team: Team,
+    team: TeamSnapshot,
     view=ui.View,
 ):
     members = team.members
-    embed = message.embeds[0]
-    embed.set_field_at(
-        index=0,
-        name=f"현제 인원: {len(members)}",
-        value=" - ".join([f"<@{member.discord_id}>" for member in members]),
-    )
-    await message.edit(embed=embed, view=view)
+    name = f"현제 인원: {len(members)}"
+    value = " - ".join([f"<@{member.discord_id}>" for member in members])
+    embed = message.embeds[0].copy()
+    shown = (embed.fields[0].name, embed.fields[0].value) if embed.fields else None
+    # the cached embed is only known to be current when no other process edits
+    # the message, with shared state it may be stale and the edit is always sent
+    if shown == (name, value) and cache.shared_state is None:
+        return
+    embed.set_field_at(index=0, name=name, value=value)
+    try:
+        message = await scheduler.submit(
+            message.channel.id,
+            Priority.STATE,
+            lambda: message.edit(embed=embed, view=view),
+            key=("edit", message.id),
+        )
+    except NotFound:
+        # deleted while the bot did not receive the event
+        message_cache.remove(message.id)
+        raise message_not_found()
+    message_cache.put(message)
 
 
 async def show_team_list(
     context: "Context",
-    teams: list[Team],
+    teams: list[TeamSnapshot],
     view: ui.View,
 ):
     description = str()
@@ -110,7 +239,7 @@ async def show_team_list(
 
 async def show_team_detail(
     message: "Message",
-    team: Team,
+    team: TeamSnapshot,
 ):
     members = team.members
     embed = Embed(
@@ -123,12 +252,12 @@ async def show_team_detail(
             [f"<@{member.discord_id}> ({member.name})" for member in members]
         ),
     )
-    await message.reply(embed=embed)
-
+    await reply(message, Priority.STATE, embed=embed)
 
-async def send_rank_team(message: "Message", team: Team, rank_team: list[int]) -> None:
-    LANE = ["탑", "정글", "미드", "원딜", "서폿"]
 
+async def send_rank_team(
+    message: "Message", team: TeamSnapshot, rank_team: list[int]
+) -> None:
     embed = Embed(
         title=f"{team.name} 팀",
         description="라인을 배정했어요.",
@@ -141,16 +270,18 @@ async def send_rank_team(message: "Message", team: Team, rank_team: list[int]) -
             value=f"<@{member.discord_id}> ({member.name})",
             inline=False,
         )
-    await message.reply(embed=embed)
+    await reply(message, Priority.STATE, embed=embed)
 
 
-async def send_custom_team(message: "Message", team: Team, rank_team: list[int]):
+async def send_custom_team(
+    message: "Message", team: TeamSnapshot, rank_team: list[int]
+):
     embed = Embed(
         title=f"{team.name} 팀",
         description="새로운 대전을 구성했어요.",
         color=0xBEBEFE,
     )
-    team_group: dict[str, list[Member]] = {TEAM_1_NAME: [], TEAM_2_NAME: []}
+    team_group: dict[str, list[MemberSnapshot]] = {TEAM_1_NAME: [], TEAM_2_NAME: []}
     for idx, m_idx in enumerate(rank_team):
         member = team.members[m_idx]
         team_name = TEAM_1_NAME if idx < ((len(rank_team) + 1) // 2) else TEAM_2_NAME
@@ -163,12 +294,62 @@ async def send_custom_team(message: "Message", team: Team, rank_team: list[int])
             ),
             inline=False,
         )
-    await message.reply(embed=embed)
+    await reply(message, Priority.STATE, embed=embed)
+
+
+async def send_draft_team(
+    message: "Message",
+    team: TeamSnapshot,
+    lobbies: list[list[int]],
+    with_lane: bool,
+):
+    embeds = []
+    for idx, lobby in enumerate(lobbies):
+        embed = Embed(
+            title=f"{team.name} 팀 - 로비 {idx + 1}",
+            description=(
+                "라인을 배정했어요." if with_lane else "새로운 대전을 구성했어요."
+            ),
+            color=Colors.BASE,
+        )
+        side_size = (len(lobby) + 1) // 2
+        for key, side in (
+            (TEAM_1_NAME, lobby[:side_size]),
+            (TEAM_2_NAME, lobby[side_size:]),
+        ):
+            lines = []
+            for pos, m_idx in enumerate(side):
+                member = team.members[m_idx]
+                line = f"<@{member.discord_id}> ({member.name})"
+                lines.append(f"{LANE[pos]}: {line}" if with_lane else line)
+            embed.add_field(name=key, value="\n".join(lines), inline=False)
+        embeds.append(embed)
+    for chunk in _chunk_embeds(embeds):
+        await reply(message, Priority.STATE, embeds=chunk)
+
+
+def _chunk_embeds(embeds: list[Embed]) -> list[list[Embed]]:
+    """
+    Group embeds into as few messages as Discord's limits per message allow.
+    """
+    chunks: list[list[Embed]] = []
+    size = 0
+    for embed in embeds:
+        if (
+            not chunks
+            or len(chunks[-1]) == MAX_MESSAGE_EMBEDS
+            or size + len(embed) > MAX_MESSAGE_EMBED_SIZE
+        ):
+            chunks.append([])
+            size = 0
+        chunks[-1].append(embed)
+        size += len(embed)
+    return chunks
 
 
-async def send_delete_alert(message: "Message", team: Team):
+async def send_delete_alert(message: "Message", team: TeamSnapshot):
     embed = Embed(
         description=f"**{team.name}** 팀이 삭제되었어요.",
         color=Colors.DANGER,
     )
-    await message.reply(embed=embed)
+    await reply(message, Priority.ANNOUNCE, embed=embed)
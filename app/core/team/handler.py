@@ -1,88 +1,196 @@
+import asyncio
 import json
 import random
 from datetime import datetime, timedelta
 
+from sqlalchemy import func, literal, or_, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
 
-from app.core import team
-
 from ...common.logger import get_logger
-from ..error.team import TeamError
-from ..model.team import Member, Team, TeamHistory
+from ..error.team import TeamError, TeamNotFoundError
+from ..model.team import (
+    Member,
+    Rating,
+    Team,
+    TeamHistory,
+    TeamSummary,
+    TeamWeight,
+)
+from .balance import draft_lobbies, split_teams
+from .sampler import sample_assignment
 
 logger = get_logger(__name__)
 
+TEAM_LIFETIME = timedelta(days=1)
+
+# Every function taking a `db` session is blocking and is meant to be run
+# through `run_in_session` or `with_session`, which commit once at the end, so
+# the functions only flush. Returned teams have their members loaded, so they
+# can still be rendered after the session is closed.
+
 
 ## new ###
-async def create_team(db: Session, message_id: int, name: str) -> Team:
-    team = Team(name=name, message_id=message_id)
+def create_team(
+    db: Session, message_id: int, name: str, guild_id: int, channel_id: int
+) -> Team:
+    team = Team(
+        name=name,
+        message_id=message_id,
+        guild_id=guild_id,
+        channel_id=channel_id,
+        members=[],
+    )
     db.add(team)
-    db.commit()
-    db.refresh(team)
+    db.flush()
+    return team
+
+
+def get_team(db: Session, team_id: int) -> Team:
+    team = db.get(Team, team_id, options=[selectinload(Team.members)])
+    if team is None:
+        raise team_not_found()
     return team
 
 
+def team_not_found() -> TeamNotFoundError:
+    return TeamNotFoundError(
+        "Team is not found.",
+        "팀을 찾을 수 없어요.",
+        "**/q**로 팀을 새로 생성해 보세요.",
+    )
+
+
 ### join ###
-def get_team_list(db: Session):
+def get_team_list(db: Session, guild_id: int) -> list[Team]:
     teams = db.exec(
         select(Team)
-        .where(Team.created_at > (datetime.now() - timedelta(days=1)))
+        .options(selectinload(Team.members))
+        .where(
+            Team.guild_id == guild_id,
+            Team.created_at > (datetime.now() - TEAM_LIFETIME),
+        )
         .order_by(Team.created_at.desc())
     ).all()
     if not teams:
-        raise TeamError(
-            "Team is not found.",
-            "팀을 찾을 수 없어요.",
-            "**/q**로 팀을 새로 생성해 보세요.",
-        )
+        raise team_not_found()
     return teams
 
 
-async def add_member(db: Session, team: Team, user_id: int, user_name: str):
+def get_active_teams(db: Session) -> list[Team]:
+    """
+    Teams of every guild that are still listed, to warm the team cache.
+    """
+    return db.exec(
+        select(Team)
+        .options(selectinload(Team.members))
+        .where(
+            Team.guild_id != None,
+            Team.created_at > (datetime.now() - TEAM_LIFETIME),
+        )
+    ).all()
+
+
+def get_unscoped_teams(db: Session) -> list[Team]:
+    """
+    Teams created before teams were scoped to a guild, which are still listed.
+    """
+    return db.exec(
+        select(Team).where(
+            Team.guild_id == None,
+            Team.unresolved_at == None,
+            or_(
+                Team.always_active == True,
+                Team.created_at > (datetime.now() - TEAM_LIFETIME),
+            ),
+        )
+    ).all()
+
+
+def set_team_channel(db: Session, team_id: int, guild_id: int, channel_id: int) -> Team:
+    team = get_team(db, team_id)
+    team.guild_id = guild_id
+    team.channel_id = channel_id
+    db.add(team)
+    return team
+
+
+def set_team_unresolved(db: Session, team_id: int) -> Team:
+    team = get_team(db, team_id)
+    team.unresolved_at = datetime.now()
+    db.add(team)
+    return team
+
+
+def already_joined(team: Team) -> TeamError:
+    return TeamError(
+        f"Already in the team {team.name}.",
+        f"이미 **{team.name}** 팀에 참가하고 있어요.",
+        "팀을 떠나려면 **/c**로 취소해 주세요.",
+    )
+
+
+def add_member(db: Session, team_id: int, user_id: int, user_name: str) -> Team:
+    team = get_team(db, team_id)
     member_ids = [member.discord_id for member in team.members]
 
     # check duplication
+    error = already_joined(team)
     if user_id in member_ids:
-        raise TeamError(
-            f"Already in the team {team.name}.",
-            f"이미 **{team.name}** 팀에 참가하고 있어요.",
-            "팀을 떠나려면 **/c**로 취소해 주세요.",
-        )
-
-    # add member
-    member = Member(discord_id=user_id, name=user_name, team_id=team.id)
-    db.add(member)
-    db.commit()
-    db.refresh(team)
+        raise error
+
+    # add member, the unique index catches a join from another process
+    team.members.append(Member(discord_id=user_id, name=user_name))
+    try:
+        db.flush()
+    except IntegrityError:
+        raise error
+    return team
 
 
 ### left ###
-async def remove_member(db: Session, team: Team, user_id: int, user_name: str):
-    member_ids = [member.discord_id for member in team.members]
+def not_joined(team: Team) -> TeamError:
+    return TeamError(
+        f"Already left the team {team.name}.",
+        f"**{team.name}** 팀에 참가하지 않았어요.",
+        "팀에 참가하려면 **/j**로 참가해 주세요.",
+    )
+
+
+def remove_member(db: Session, team_id: int, user_id: int, user_name: str) -> Team:
+    team = get_team(db, team_id)
+    member = next(
+        (member for member in team.members if member.discord_id == user_id), None
+    )
 
     # check duplication
-    if user_id not in member_ids:
-        raise TeamError(
-            f"Already left the team {team.name}.",
-            f"**{team.name}** 팀에 참가하지 않았어요.",
-            "팀에 참가하려면 **/j**로 참가해 주세요.",
-        )
+    if member is None:
+        raise not_joined(team)
 
     # delete member
-    member = db.exec(
-        select(Member).where(Member.team == team, Member.discord_id == user_id)
-    ).first()
+    team.members.remove(member)
     db.delete(member)
-    db.commit()
-    db.refresh(team)
+    db.flush()
+    return team
 
 
 ### shuffle ###
 MULTIPLE = 0.1
-BASE_WEIGHT = [[10000.0 for _ in range(5)] for _ in range(5)]
-
-
-async def get_random_team(db: Session, team: Team) -> list[int]:
+LANE_COUNT = 5
+BASE_WEIGHT = 10000.0
+
+
+def get_random_team(
+    db: Session, team_id: int, weight: list[list[float]] | None = None
+) -> tuple[Team, list[int], list[list[float]] | None]:
+    """
+    :param weight: Lane weight of the team when it is already known, e.g.
+        from the shared team state, so the stored one is not loaded.
+    :return: The team, its shuffled member indices and its new lane weight
+        when lanes were assigned.
+    """
+    team = get_team(db, team_id)
     members = team.members
     if len(members) == 1:
         raise TeamError(
@@ -90,59 +198,292 @@ async def get_random_team(db: Session, team: Team) -> list[int]:
             "한명으로 팀을 어케 만듭니까?",
             "친구를 데려와 주세요.",
         )
-    if len(members) == 5:
-        return await _shuffle_rank(db, team)
+    if len(members) == LANE_COUNT:
+        return team, *_shuffle_rank(db, team, weight)
     else:
-        return await shuffle_custom(team)
-
-
-async def _shuffle_rank(db: Session, team: Team) -> None:
-    histories = db.exec(select(TeamHistory).where(TeamHistory.team == team)).all()
-    rank_team = await _get_rank_team(histories)
-    db.add(TeamHistory(team=team, numbers=json.dumps(rank_team)))
-    db.commit()
-    return rank_team
+        return team, shuffle_custom(db, team), None
+
+
+def _shuffle_rank(
+    db: Session, team: Team, weight: list[list[float]] | None = None
+) -> tuple[list[int], list[list[float]]]:
+    known = weight is not None
+    if weight is None:
+        weight = _get_weight(db, team)
+    rank_team = _get_rank_team(weight)
+    db.add(TeamHistory(team=team, numbers=TeamHistory.encode(rank_team)))
+    new_weight = _calc_weight(weight, rank_team)
+    if known:
+        _update_weight(db, team.id, new_weight)
+    else:
+        _save_weight(team, new_weight)
+    db.flush()
+    return rank_team, new_weight
 
 
-async def _get_rank_team(histories: list[TeamHistory]) -> list[int]:
-    team = []
-    weights = await _get_weight(histories)
-    while len(set(team)) != 5:
-        team.clear()
-        for i in range(5):
-            team.append(random.choices(range(5), weights=weights[i])[0])
+def _get_rank_team(weights: list[list[float]]) -> list[int]:
+    team = sample_assignment(weights)
     new_team = team.copy()
     for i, member in enumerate(team):
         new_team[member] = i
     return new_team
 
 
-async def _get_weight(histories: list[TeamHistory]) -> list[list[float]]:
-    weight = BASE_WEIGHT.copy()
-    for history in histories:
-        members: list[int] = json.loads(history.numbers)
-        weight = _calc_weight(weight, members)
+def _get_weight(db: Session, team: Team) -> list[list[float]]:
+    if team.weight is None:
+        return rebuild_weight(db, team)
+    return json.loads(team.weight.weights)
+
+
+def rebuild_weight(db: Session, team: Team) -> list[list[float]]:
+    """
+    Replay every history of the team from the base weight and store the result.
+    Only needed for teams without a stored weight or to recover a broken one.
+    """
+    histories = db.exec(
+        select(TeamHistory.numbers)
+        .where(TeamHistory.team_id == team.id)
+        .order_by(TeamHistory.id)
+    ).all()
+    weight = _base_weight()
+    for numbers in histories:
+        weight = _calc_weight(weight, TeamHistory.decode(numbers))
+    _save_weight(team, weight)
+    db.flush()
+    logger.info(f"rebuilt weight of team {team.name} from {len(histories)} histories")
     return weight
 
 
+def get_lane_counts(db: Session, team: Team) -> list[list[int]]:
+    """
+    Count how many times each member played each lane, aggregated in SQL.
+
+    :return: `counts[member_no][lane_no]`
+    """
+    queries = [
+        select(
+            literal(lane_no).label("lane_no"),
+            func.substr(TeamHistory.numbers, lane_no + 1, 1).label("member_no"),
+            func.count().label("played"),
+        )
+        .where(TeamHistory.team_id == team.id)
+        .group_by(func.substr(TeamHistory.numbers, lane_no + 1, 1))
+        for lane_no in range(LANE_COUNT)
+    ]
+    counts = [[0 for _ in range(LANE_COUNT)] for _ in range(LANE_COUNT)]
+    for lane_no, member_no, played in db.exec(union_all(*queries)).all():
+        counts[int(member_no)][lane_no] = played
+    return counts
+
+
+def _base_weight() -> list[list[float]]:
+    return [[BASE_WEIGHT for _ in range(LANE_COUNT)] for _ in range(LANE_COUNT)]
+
+
+def _save_weight(team: Team, weight: list[list[float]]) -> None:
+    if team.weight is None:
+        team.weight = TeamWeight(weights=json.dumps(weight))
+    else:
+        team.weight.weights = json.dumps(weight)
+        team.weight.updated_at = datetime.now()
+
+
+def _update_weight(db: Session, team_id: int, weight: list[list[float]]) -> None:
+    """
+    Store the weight of a team with a keyed UPDATE, without loading its row.
+    """
+    result = db.exec(
+        update(TeamWeight)
+        .where(TeamWeight.team_id == team_id)
+        .values(weights=json.dumps(weight), updated_at=datetime.now())
+    )
+    if result.rowcount == 0:
+        db.add(TeamWeight(team_id=team_id, weights=json.dumps(weight)))
+
+
 def _calc_weight(weight: list[list[float]], record: list[int]) -> list[list[float]]:
-    new_weight = weight.copy()
+    new_weight = [row.copy() for row in weight]
     for lane_no, member_no in enumerate(record):
-        remain = (new_weight[member_no][lane_no] * (1 - MULTIPLE)) // 4
-        for i in range(5):
-            if i == lane_no:
-                new_weight[member_no][i] -= remain * 4
-            else:
-                new_weight[member_no][i] += remain
+        _play_lane(new_weight[member_no], lane_no)
     return new_weight
 
 
-async def shuffle_custom(team: Team) -> list[int]:
-    members = [i for i in range(len(team.members))]
-    random.shuffle(members)
-    return members
+def _play_lane(member_weight: list[float], lane_no: int) -> None:
+    remain = (member_weight[lane_no] * (1 - MULTIPLE)) // 4
+    for i in range(LANE_COUNT):
+        if i == lane_no:
+            member_weight[i] -= remain * 4
+        else:
+            member_weight[i] += remain
 
 
-async def delete_team(db: Session, team: team):
+def shuffle_custom(db: Session, team: Team) -> list[int]:
+    ratings = _get_member_ratings(db, team)
+    if ratings is None:
+        shuffled = [i for i in range(len(team.members))]
+        random.shuffle(shuffled)
+        return shuffled
+    return split_teams(ratings)
+
+
+### draft ###
+DRAFT_LOBBY_SIZE = LANE_COUNT * 2
+MAX_DRAFT_LOBBY = 10
+
+
+def get_draft_team(
+    db: Session, team_id: int
+) -> tuple[Team, list[float], list[list[float]]]:
+    """
+    Load a team to draft, the rating and the lane weight of each of its members.
+    """
+    team = get_team(db, team_id)
+    members = team.members
+    if len(members) < DRAFT_LOBBY_SIZE:
+        raise TeamError(
+            "Not enough members for a draft.",
+            f"드래프트는 {DRAFT_LOBBY_SIZE}명 이상부터 할 수 있어요.",
+            "**/s**로 팀을 섞어 보세요.",
+        )
+    if len(members) > DRAFT_LOBBY_SIZE * MAX_DRAFT_LOBBY:
+        raise TeamError(
+            "Too many members for a draft.",
+            f"드래프트는 {DRAFT_LOBBY_SIZE * MAX_DRAFT_LOBBY}명까지 할 수 있어요.",
+        )
+    ratings = _get_member_ratings(db, team) or [0.0 for _ in members]
+    return team, ratings, _get_member_lane_weights(db, team)
+
+
+async def draft(
+    ratings: list[float], lane_weights: list[list[float]]
+) -> tuple[list[list[int]], bool]:
+    """
+    Partition a large team into lobbies of two balanced sides. When every
+    lobby is full, each side is also ordered by lane.
+
+    :param lane_weights: Lane weight of each member, see `_get_member_lane_weights`.
+    :return: Member indices of each lobby and whether lanes were assigned.
+    """
+    with_lane = len(ratings) % DRAFT_LOBBY_SIZE == 0
+    loop = asyncio.get_running_loop()
+    lobbies = await loop.run_in_executor(None, _draft, ratings, lane_weights, with_lane)
+    return lobbies, with_lane
+
+
+def _draft(
+    ratings: list[float], lane_weights: list[list[float]], with_lane: bool
+) -> list[list[int]]:
+    lobbies = draft_lobbies(ratings, DRAFT_LOBBY_SIZE)
+    if not with_lane:
+        return lobbies
+    return [
+        _assign_lane(lobby[:LANE_COUNT], lane_weights)
+        + _assign_lane(lobby[LANE_COUNT:], lane_weights)
+        for lobby in lobbies
+    ]
+
+
+def _assign_lane(side: list[int], lane_weights: list[list[float]]) -> list[int]:
+    lanes = sample_assignment([lane_weights[member] for member in side])
+    ordered = side.copy()
+    for member, lane in zip(side, lanes):
+        ordered[lane] = member
+    return ordered
+
+
+def get_lane_history(
+    db: Session, guild_id: int, user_ids: list[int]
+) -> dict[int, list[int]]:
+    """
+    How many times each user played each lane in the archived teams of the guild.
+    """
+    rows = db.exec(
+        select(TeamSummary.discord_id, TeamSummary.lane_counts).where(
+            TeamSummary.guild_id == guild_id,
+            TeamSummary.discord_id.in_(user_ids),
+            TeamSummary.games > 0,
+        )
+    ).all()
+    history: dict[int, list[int]] = {}
+    for discord_id, lane_counts in rows:
+        counts = history.setdefault(discord_id, [0] * LANE_COUNT)
+        for lane_no, played in enumerate(lane_counts.split(",")):
+            counts[lane_no] += int(played)
+    return history
+
+
+def _get_member_lane_weights(db: Session, team: Team) -> list[list[float]]:
+    """
+    Rank weight of every member as if they had played their lane history in
+    one team, so drafted members are less likely to get the lanes they played
+    most. Members without history get the base weight.
+    """
+    history = {}
+    if team.guild_id is not None:
+        user_ids = [member.discord_id for member in team.members]
+        history = get_lane_history(db, team.guild_id, user_ids)
+    return [
+        _lane_weight(history.get(member.discord_id, [0] * LANE_COUNT))
+        for member in team.members
+    ]
+
+
+def _lane_weight(counts: list[int]) -> list[float]:
+    member_weight = [BASE_WEIGHT for _ in range(LANE_COUNT)]
+    remaining = counts.copy()
+    # interleave the lanes, so the lane played last isn't favoured by order
+    while any(remaining):
+        for lane_no in range(LANE_COUNT):
+            if remaining[lane_no]:
+                _play_lane(member_weight, lane_no)
+                remaining[lane_no] -= 1
+    return member_weight
+
+
+### rating ###
+def get_ratings(db: Session, guild_id: int, user_ids: list[int]) -> dict[int, int]:
+    ratings = db.exec(
+        select(Rating).where(
+            Rating.guild_id == guild_id, Rating.discord_id.in_(user_ids)
+        )
+    ).all()
+    return {rating.discord_id: rating.rating for rating in ratings}
+
+
+def _get_member_ratings(db: Session, team: Team) -> list[float] | None:
+    if team.guild_id is None:
+        return None
+    members = team.members
+    ratings = get_ratings(db, team.guild_id, [member.discord_id for member in members])
+    if not ratings:
+        return None
+
+    # unrated members count as the average of the rated ones
+    average = sum(ratings.values()) / len(ratings)
+    return [ratings.get(member.discord_id, average) for member in members]
+
+
+def set_rating(db: Session, guild_id: int, user_id: int, value: int) -> Rating:
+    if value < 0:
+        raise TeamError(
+            f"Invalid rating {value}.",
+            "점수는 0 이상이어야 해요.",
+        )
+    rating = db.exec(
+        select(Rating).where(Rating.guild_id == guild_id, Rating.discord_id == user_id)
+    ).first()
+    if rating is None:
+        rating = Rating(guild_id=guild_id, discord_id=user_id, rating=value)
+    else:
+        rating.rating = value
+        rating.updated_at = datetime.now()
+    db.add(rating)
+    db.flush()
+    return rating
+
+
+def delete_team(db: Session, team_id: int) -> Team:
+    team = get_team(db, team_id)
     db.delete(team)
-    db.commit()
+    db.flush()
+    return team
@@ -0,0 +1,34 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
+
+class TeamLocks:
+    """
+    One asyncio lock per team, so changes of a team are applied one at a time
+    and in arrival order while other teams proceed in parallel. A lock is
+    dropped once nobody holds or waits for it.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._users: dict[int, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, team_id: int) -> AsyncGenerator[None, None]:
+        lock = self._locks.setdefault(team_id, asyncio.Lock())
+        self._users[team_id] = self._users.get(team_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[team_id] -= 1
+            if self._users[team_id] == 0:
+                del self._users[team_id]
+                del self._locks[team_id]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+team_locks = TeamLocks()
@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import itertools
+import os
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Hashable
+
+from ...common.logger import get_logger
+
+logger = get_logger(__name__)
+
+# queued requests of a channel above which announcements are dropped
+PRESSURE_DEPTH = int(os.getenv("OUTBOUND_PRESSURE_DEPTH", "5"))
+
+
+class Priority(IntEnum):
+    ACK = 0  # interaction responses, which expire after 3 seconds
+    STATE = 1  # team message edits and command results
+    ANNOUNCE = 2  # alerts that may be dropped under pressure
+
+
+# seconds a request may wait before it counts as late
+DEADLINES = {Priority.ACK: 3.0, Priority.STATE: 15.0, Priority.ANNOUNCE: 30.0}
+
+
+@dataclass(order=True)
+class OutboundRequest:
+    priority: Priority
+    seq: int
+    send: Callable[[], Awaitable[Any]] = field(compare=False)
+    deadline: float = field(compare=False)
+    key: Hashable | None = field(compare=False, default=None)
+    futures: list[asyncio.Future] = field(compare=False, default_factory=list)
+
+
+@dataclass
+class OutboundStats:
+    sent: dict[str, int] = field(default_factory=dict)
+    merged: int = 0
+    dropped: int = 0
+    deadline_misses: dict[str, int] = field(default_factory=dict)
+    failed: int = 0
+
+
+class OutboundScheduler:
+    """
+    Sends the bot's Discord requests by priority, one at a time per channel,
+    so the requests of a channel never compete for its rate limit bucket and
+    cosmetic ones wait behind those a user is waiting for.
+
+    Interaction responses skip the channel queue, as they are not limited by
+    the channel bucket. A queued request with the same key as a new one is
+    replaced by it, and announcements are dropped when the channel is backed
+    up or they are late.
+    """
+
+    def __init__(self, pressure_depth: int = PRESSURE_DEPTH) -> None:
+        self.pressure_depth = pressure_depth
+        self.stats = OutboundStats()
+        self._queues: dict[int, list[OutboundRequest]] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._seq = itertools.count()
+
+    async def submit(
+        self,
+        channel_id: int,
+        priority: Priority,
+        send: Callable[[], Awaitable[Any]],
+        key: Hashable | None = None,
+        deadline: float | None = None,
+    ) -> Any:
+        """
+        :param send: Sends the request when called.
+        :param key: Requests with the same key replace each other while queued.
+        :param deadline: Loop time the request should be sent by.
+        :return: The result of `send`, or None when the request was dropped.
+        """
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + DEADLINES[priority]
+        if priority == Priority.ACK:
+            return await self._send(
+                OutboundRequest(priority, next(self._seq), send, deadline)
+            )
+
+        queue = self._queues.setdefault(channel_id, [])
+        future = loop.create_future()
+        queued = self._find(queue, key)
+        if queued is not None:
+            # the newer request wins, every caller gets its result
+            queue.remove(queued)
+            heapq.heapify(queue)
+            self.stats.merged += 1
+            request = OutboundRequest(
+                priority, queued.seq, send, deadline, key, queued.futures + [future]
+            )
+        elif priority == Priority.ANNOUNCE and len(queue) >= self.pressure_depth:
+            self.stats.dropped += 1
+            return None
+        else:
+            request = OutboundRequest(
+                priority, next(self._seq), send, deadline, key, [future]
+            )
+        heapq.heappush(queue, request)
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.create_task(self._work(channel_id))
+        return await future
+
+    @staticmethod
+    def _find(
+        queue: list[OutboundRequest], key: Hashable | None
+    ) -> OutboundRequest | None:
+        if key is None:
+            return None
+        return next((request for request in queue if request.key == key), None)
+
+    async def _work(self, channel_id: int) -> None:
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                request = heapq.heappop(queue)
+                try:
+                    result = await self._send(request)
+                except Exception as e:
+                    for future in request.futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for future in request.futures:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                del self._queues[channel_id]
+
+    async def _send(self, request: OutboundRequest) -> Any:
+        name = request.priority.name.lower()
+        if asyncio.get_running_loop().time() > request.deadline:
+            misses = self.stats.deadline_misses
+            misses[name] = misses.get(name, 0) + 1
+            logger.warning(f"{name} request missed its deadline ({self.depth()})")
+            if request.priority == Priority.ANNOUNCE:
+                self.stats.dropped += 1
+                return None
+        try:
+            result = await request.send()
+        except Exception:
+            self.stats.failed += 1
+            raise
+        self.stats.sent[name] = self.stats.sent.get(name, 0) + 1
+        return result
+
+    def depth(self) -> dict[str, int]:
+        depth = {priority.name.lower(): 0 for priority in Priority}
+        for queue in self._queues.values():
+            for request in queue:
+                depth[request.priority.name.lower()] += 1
+        return depth
+
+    async def drain(self) -> None:
+        """
+        Wait until every queued request is sent, e.g. before shutting down.
+        """
+        while self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+
+scheduler = OutboundScheduler()
+
+
+def get_outbound_stats() -> dict:
+    stats = scheduler.stats
+    return {
+        "depth": scheduler.depth(),
+        "channels": len(scheduler._queues),
+        "sent": dict(stats.sent),
+        "merged": stats.merged,
+        "dropped": stats.dropped,
+        "deadline_misses": dict(stats.deadline_misses),
+        "failed": stats.failed,
+    }
@@ -0,0 +1,118 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from discord import ui
+
+from ...common.logger import get_logger
+from . import controller
+from .lock import TeamLocks
+from .snapshot import TeamSnapshot
+
+if TYPE_CHECKING:
+    from discord import Message
+
+logger = get_logger(__name__)
+
+RENDER_WINDOW = float(os.getenv("TEAM_RENDER_WINDOW", "1.0"))
+
+
+@dataclass
+class PendingRender:
+    message: "Message"
+    team: TeamSnapshot | None = None
+    view: ui.View | None = None
+    joined: list[int] = field(default_factory=list)
+    left: list[int] = field(default_factory=list)
+    task: asyncio.Task | None = None
+
+
+class TeamRenderer:
+    """
+    Debounced updates of team messages.
+
+    Changes rendered within `window` seconds of the first one collapse into a
+    single edit showing the latest team, and their join / leave alerts into a
+    single reply. An edit that would not change the embed is skipped.
+    """
+
+    def __init__(self, window: float = RENDER_WINDOW) -> None:
+        self.window = window
+        self._pending: dict[int, PendingRender] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # keeps the flushes of one message in order
+        self._locks = TeamLocks()
+
+    def render(
+        self,
+        message: "Message",
+        team: TeamSnapshot,
+        view: ui.View,
+        joined: int | None = None,
+        left: int | None = None,
+    ) -> None:
+        """
+        :param team: The latest state of the team, rendered when flushed.
+        :param joined: User to announce as joined.
+        :param left: User to announce as left.
+        """
+        pending = self._pending.get(message.id)
+        if pending is None:
+            pending = PendingRender(message)
+            pending.task = asyncio.create_task(self._flush_later(message.id))
+            self._tasks.add(pending.task)
+            pending.task.add_done_callback(self._tasks.discard)
+            self._pending[message.id] = pending
+        pending.team = team
+        pending.view = view
+        if joined is not None:
+            _merge(pending.joined, pending.left, joined)
+        if left is not None:
+            _merge(pending.left, pending.joined, left)
+
+    async def _flush_later(self, message_id: int) -> None:
+        await asyncio.sleep(self.window)
+        await self._flush(message_id)
+
+    async def _flush(self, message_id: int) -> None:
+        pending = self._pending.pop(message_id, None)
+        if pending is None:
+            # already flushed by flush_all
+            return
+        async with self._locks.hold(message_id):
+            message = controller.message_cache.get(message_id) or pending.message
+            try:
+                await controller.update_team_message(
+                    message, pending.team, pending.view
+                )
+                if pending.joined or pending.left:
+                    await controller.send_member_alert(
+                        message, pending.team, pending.joined, pending.left
+                    )
+            except Exception as e:
+                logger.warning(f"failed to render team message {message_id}: {e}")
+
+    async def flush_all(self) -> None:
+        """
+        Send every pending change now, e.g. before shutting down.
+        """
+        # a message is pending only while its timer sleeps, a timer that fired
+        # popped it, so it is never cancelled mid edit and awaited below
+        while self._pending:
+            message_id, pending = next(iter(self._pending.items()))
+            pending.task.cancel()
+            await self._flush(message_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def _merge(added: list[int], opposite: list[int], user_id: int) -> None:
+    # joining and leaving again within the window cancel each other out
+    if user_id in opposite:
+        opposite.remove(user_id)
+    elif user_id not in added:
+        added.append(user_id)
+
+
+team_renderer = TeamRenderer()
@@ -0,0 +1,118 @@
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from ...common.logger import get_logger
+from ..model.team import Member, Team, TeamHistory, TeamSummary, TeamWeight
+from . import handler
+
+logger = get_logger(__name__)
+
+# raw rows are kept a while after a team stops being listed, so its buttons
+# keep working for late players
+TEAM_RETENTION = timedelta(days=float(os.getenv("TEAM_RETENTION_DAYS", "7")))
+TEAMS_PER_RUN = int(os.getenv("TEAM_RETENTION_TEAMS_PER_RUN", "100"))
+DELETE_BATCH_SIZE = int(os.getenv("TEAM_RETENTION_BATCH_SIZE", "1000"))
+
+
+@dataclass
+class RetentionReport:
+    teams: int = 0
+    members: int = 0
+    histories: int = 0
+    duration_ms: float = 0.0
+
+
+def get_expired_teams(db: Session, limit: int = TEAMS_PER_RUN) -> list[Team]:
+    retention = max(TEAM_RETENTION, handler.TEAM_LIFETIME)
+    return db.exec(
+        select(Team)
+        .where(
+            Team.always_active == False,
+            Team.created_at <= datetime.now() - retention,
+        )
+        .order_by(Team.created_at)
+        .limit(limit)
+    ).all()
+
+
+def prune_teams(
+    db: Session, limit: int = TEAMS_PER_RUN, batch_size: int = DELETE_BATCH_SIZE
+) -> RetentionReport:
+    """
+    Archive expired teams into `TeamSummary` and delete their raw rows.
+
+    Every step commits on its own and histories are deleted in batches, so
+    no lock is held for long. A run interrupted halfway is finished by the
+    next run.
+
+    :param limit: Maximum number of teams archived by this run.
+    :param batch_size: Maximum number of histories deleted per transaction.
+    """
+    started = time.perf_counter()
+    report = RetentionReport()
+    for team in get_expired_teams(db, limit):
+        report.members += archive_team(db, team)
+        report.histories += _delete_histories(db, team.id, batch_size)
+        db.exec(delete(TeamWeight).where(TeamWeight.team_id == team.id))
+        db.exec(delete(Member).where(Member.team_id == team.id))
+        db.exec(delete(Team).where(Team.id == team.id))
+        db.commit()
+        report.teams += 1
+    report.duration_ms = (time.perf_counter() - started) * 1000
+    return report
+
+
+def archive_team(db: Session, team: Team) -> int:
+    """
+    Store the lane counts and games played of every member of the team.
+
+    :return: Number of archived members.
+    """
+    archived = db.exec(
+        select(TeamSummary.id).where(TeamSummary.team_id == team.id).limit(1)
+    ).first()
+    if archived is not None:
+        return 0
+
+    members = team.members
+    counts = (
+        handler.get_lane_counts(db, team)
+        if len(members) == handler.LANE_COUNT
+        else [[0] * handler.LANE_COUNT for _ in members]
+    )
+    for member, lane_counts in zip(members, counts):
+        db.add(
+            TeamSummary(
+                team_id=team.id,
+                team_name=team.name,
+                guild_id=team.guild_id,
+                discord_id=member.discord_id,
+                name=member.name,
+                lane_counts=",".join(str(count) for count in lane_counts),
+                games=sum(lane_counts),
+                team_created_at=team.created_at,
+            )
+        )
+    db.commit()
+    return len(members)
+
+
+def _delete_histories(db: Session, team_id: int, batch_size: int) -> int:
+    deleted = 0
+    while True:
+        batch = (
+            select(TeamHistory.id)
+            .where(TeamHistory.team_id == team_id)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = db.exec(delete(TeamHistory).where(TeamHistory.id.in_(batch)))
+        db.commit()
+        if result.rowcount == 0:
+            return deleted
+        deleted += result.rowcount
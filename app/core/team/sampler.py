@@ -0,0 +1,32 @@
+import random
+from functools import lru_cache
+from itertools import permutations
+from math import prod
+
+
+@lru_cache(maxsize=None)
+def _permutations(size: int) -> tuple[tuple[int, ...], ...]:
+    return tuple(permutations(range(size)))
+
+
+def sample_assignment(weights: list[list[float]]) -> list[int]:
+    """
+    Draw a lane for every member so that no lane is taken twice.
+
+    `weights[member][lane]` is the weight of the member playing the lane.
+    Every assignment is drawn with a probability proportional to the product
+    of its weights, so it always costs `size!` products however skewed the
+    weights are.
+
+    :param weights: Square matrix of non-negative weights.
+    :return: The lane of each member.
+    """
+    size = len(weights)
+    candidates = _permutations(size)
+    scores = [
+        prod(weights[member][lane] for member, lane in enumerate(candidate))
+        for candidate in candidates
+    ]
+    if sum(scores) <= 0:
+        return list(random.choice(candidates))
+    return list(random.choices(candidates, weights=scores)[0])
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Awaitable, Callable
+
+import redis.asyncio as redis
+
+from ...common.logger import get_logger
+from .snapshot import TeamSnapshot
+
+logger = get_logger(__name__)
+
+INVALIDATE_CHANNEL = "team:invalidate"
+
+# Returns -1 when the set is unknown (never seeded or expired), so the caller
+# falls back to the database, otherwise the result of SADD / SREM.
+_MEMBER_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+if ARGV[1] == 'add' then
+    return redis.call('SADD', KEYS[1], ARGV[2])
+end
+return redis.call('SREM', KEYS[1], ARGV[2])
+"""
+
+# Replaces the member set in one step, so concurrent commands never see a
+# half written set.
+_SEED_SCRIPT = """
+redis.call('DEL', KEYS[1])
+if #ARGV > 1 then
+    redis.call('SADD', KEYS[1], unpack(ARGV, 2))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class SharedTeamState:
+    """
+    Team membership and lane weights shared by every bot process in Redis.
+
+    The database stays the source of truth: Redis answers duplicate join and
+    leave checks atomically before the database is touched, and tells the
+    other processes which teams to reload from the database.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.origin = uuid.uuid4().hex
+        self._member_script = client.register_script(_MEMBER_SCRIPT)
+        self._seed_script = client.register_script(_SEED_SCRIPT)
+        self._listener: asyncio.Task | None = None
+
+    @staticmethod
+    def _members_key(team_id: int) -> str:
+        return f"team:{team_id}:members"
+
+    @staticmethod
+    def _weight_key(team_id: int) -> str:
+        return f"team:{team_id}:weight"
+
+    async def add_member(self, team_id: int, user_id: int) -> int:
+        """
+        :return: 1 if added, 0 if already a member, -1 if unknown.
+        """
+        return await self._member_script(
+            keys=[self._members_key(team_id)], args=["add", user_id, self.ttl]
+        )
+
+    async def remove_member(self, team_id: int, user_id: int) -> int:
+        """
+        :return: 1 if removed, 0 if not a member, -1 if unknown.
+        """
+        return await self._member_script(
+            keys=[self._members_key(team_id)], args=["remove", user_id, self.ttl]
+        )
+
+    async def seed(self, team: TeamSnapshot) -> None:
+        await self._seed_script(
+            keys=[self._members_key(team.id)],
+            args=[self.ttl, *[member.discord_id for member in team.members]],
+        )
+
+    async def get_weight(self, team_id: int) -> list[list[float]] | None:
+        weight = await self.client.get(self._weight_key(team_id))
+        return json.loads(weight) if weight is not None else None
+
+    async def set_weight(self, team_id: int, weight: list[list[float]]) -> None:
+        """
+        Only set after the weight is committed to the database, so the shared
+        weight is never ahead of the stored one.
+        """
+        await self.client.set(
+            self._weight_key(team_id), json.dumps(weight), ex=self.ttl
+        )
+
+    async def drop(self, team_id: int) -> None:
+        await self.client.delete(self._members_key(team_id), self._weight_key(team_id))
+
+    async def publish(self, team_id: int) -> None:
+        message = json.dumps({"origin": self.origin, "team_id": team_id})
+        await self.client.publish(INVALIDATE_CHANNEL, message)
+
+    def start_listener(self, callback: Callable[[int], Awaitable[None]]) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen(callback))
+
+    async def _listen(self, callback: Callable[[int], Awaitable[None]]) -> None:
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        data = json.loads(message["data"])
+                        if data["origin"] != self.origin:
+                            await callback(data["team_id"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"team invalidation listener failed: {e}")
+                await asyncio.sleep(5)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self.client.aclose()
+
+
+def create_shared_state(ttl: int) -> SharedTeamState | None:
+    redis_url = os.getenv("REDIS_URL")
+    if not redis_url:
+        return None
+    return SharedTeamState(redis.from_url(redis_url), ttl)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import NamedTuple
+
+from ..model.team import Team
+
+
+class MemberSnapshot(NamedTuple):
+    discord_id: int
+    name: str
+
+
+class TeamSnapshot(NamedTuple):
+    """
+    Immutable copy of a team and its members, taken while its session is
+    open. Views, renderers and the team cache hold these instead of ORM
+    objects, so rendering never lazy loads and snapshots can be shared
+    between tasks.
+    """
+
+    id: int
+    name: str
+    message_id: int
+    guild_id: int | None
+    channel_id: int | None
+    created_at: datetime
+    members: tuple[MemberSnapshot, ...]
+
+    @classmethod
+    def of(cls, team: Team) -> "TeamSnapshot":
+        return cls(
+            id=team.id,
+            name=team.name,
+            message_id=team.message_id,
+            guild_id=team.guild_id,
+            channel_id=team.channel_id,
+            created_at=team.created_at,
+            members=tuple(
+                MemberSnapshot(member.discord_id, member.name)
+                for member in team.members
+            ),
+        )
@@ -1,16 +1,27 @@
 import discord
 from discord import ui
-from sqlmodel import Session
 
 from ...common.logger import get_logger
-from ..database import get_session
 from ..error.team import TeamBaseError
-from ..model.team import Team
-from . import controller, handler
+from . import cache, controller, handler
+from .lock import team_locks
+from .render import team_renderer
+from .snapshot import TeamSnapshot
 
 logger = get_logger(__name__)
 
 
+async def handle_error(interaction: discord.Interaction, error: Exception):
+    if isinstance(error, TeamBaseError):
+        if error.alert:
+            embed = error.get_embed()
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        logger.warning(f"{interaction.user} (ID: {interaction.user.id}) raised {error}")
+    else:
+        logger.info("timeout")
+        raise error
+
+
 class BaseTeamView(ui.View):
     def __init__(self, timeout=None):
         super().__init__(timeout=timeout)
@@ -18,38 +29,63 @@ class BaseTeamView(ui.View):
     async def on_error(
         self, interaction: discord.Interaction, error: Exception, item: ui.Item
     ):
-        if isinstance(error, TeamBaseError):
-            if error.alert:
-                embed = error.get_embed()
-                await interaction.followup.send(embed=embed, ephemeral=True)
-            logger.warning(
-                f"{interaction.user} (ID: {interaction.user.id}) raised {error}"
-            )
-        else:
-            logger.info("timeout")
-            raise error
-
-
-class JoinTeamView(BaseTeamView):
-    def __init__(self, team: Team):
+        await handle_error(interaction, error)
+
+
+# label and style of the button of every team action
+TEAM_ACTIONS = {
+    "join": ("참가", discord.ButtonStyle.success),
+    "left": ("떠나기", discord.ButtonStyle.secondary),
+    "shuffle": ("팀 섞기", discord.ButtonStyle.primary),
+    "delete": ("팀 삭제", discord.ButtonStyle.danger),
+}
+
+
+class TeamButton(
+    ui.DynamicItem[ui.Button],
+    template=r"team:(?P<action>join|left|shuffle|delete):(?P<team_id>[0-9]+)",
+):
+    """
+    A button of a team action, routed by its custom_id. It keeps no state
+    besides the id, so it is registered once and works after a restart.
+    """
+
+    def __init__(self, action: str, team_id: int) -> None:
+        label, style = TEAM_ACTIONS[action]
+        super().__init__(
+            ui.Button(label=label, style=style, custom_id=f"team:{action}:{team_id}")
+        )
+        self.action = action
+        self.team_id = team_id
+
+    @classmethod
+    async def from_custom_id(
+        cls, interaction: discord.Interaction, item: ui.Button, match
+    ) -> "TeamButton":
+        return cls(match["action"], int(match["team_id"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        await controller.defer(interaction)
+        try:
+            await ACTION_HANDLERS[self.action](interaction, self.team_id)
+        except Exception as error:
+            await handle_error(interaction, error)
+
+
+class JoinTeamView(ui.View):
+    def __init__(self, team_id: int):
         super().__init__(timeout=None)
-        self.team = team
-
-    @ui.button(label="참가", style=discord.ButtonStyle.success)
-    async def join(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer()
-        with get_session() as session:
-            await join_team(session, interaction, self.team)
+        self.add_item(TeamButton("join", team_id))
 
 
 class TeamJoinView(BaseTeamView):
-    def __init__(self, teams: list[Team]):
+    def __init__(self, teams: list[TeamSnapshot]):
         super().__init__(timeout=10)
         for team in teams:
             self.add_item(item=self.TeamButton(team))
 
     class TeamButton(ui.Button["TeamJoinView"]):
-        def __init__(self, team: Team):
+        def __init__(self, team: TeamSnapshot):
             super().__init__(
                 label=team.name if len(team.name) < 10 else team.name[:10] + "...",
                 style=discord.ButtonStyle.primary,
@@ -57,19 +93,18 @@ class TeamJoinView(BaseTeamView):
             self.team = team
 
         async def callback(self, interaction: discord.Interaction):
-            await interaction.response.defer()
-            with get_session() as session:
-                await join_team(session, interaction, self.team)
+            await controller.defer(interaction)
+            await join_team(interaction, self.team.id)
 
 
 class TeamLeftView(BaseTeamView):
-    def __init__(self, teams: list[Team]):
+    def __init__(self, teams: list[TeamSnapshot]):
         super().__init__(timeout=10)
         for team in teams:
             self.add_item(item=self.TeamButton(team))
 
     class TeamButton(ui.Button["TeamLeftView"]):
-        def __init__(self, team: Team):
+        def __init__(self, team: TeamSnapshot):
             super().__init__(
                 label=team.name if len(team.name) < 10 else team.name[:10] + "...",
                 style=discord.ButtonStyle.primary,
@@ -77,19 +112,18 @@ class TeamLeftView(BaseTeamView):
             self.team = team
 
         async def callback(self, interaction: discord.Interaction):
-            await interaction.response.defer()
-            with get_session() as session:
-                await left_team(session, interaction, self.team)
+            await controller.defer(interaction)
+            await left_team(interaction, self.team.id)
 
 
 class TeamInfoView(BaseTeamView):
-    def __init__(self, teams: list[Team]):
+    def __init__(self, teams: list[TeamSnapshot]):
         super().__init__(timeout=10)
         for idx, team in enumerate(teams):
             self.add_item(item=self.TeamButton(idx + 1, team))
 
     class TeamButton(ui.Button["TeamInfoView"]):
-        def __init__(self, idx: int, team: Team):
+        def __init__(self, idx: int, team: TeamSnapshot):
             super().__init__(
                 label=str(idx),
                 style=discord.ButtonStyle.primary,
@@ -97,69 +131,32 @@ class TeamInfoView(BaseTeamView):
             self.team = team
 
         async def callback(self, interaction: discord.Interaction):
-            with get_session() as session:
-                self.team = session.get(Team, self.team.id)
-                message = await controller.fetch_message(interaction.channel, self.team)
-                await controller.show_team_detail(message, self.team)
-                view = TeamControlView(self.team)
-                await interaction.response.send_message(
-                    f"**{self.team.name}**팀 메뉴", view=view, ephemeral=True
-                )
-                self.view.stop()
-
-
-class TeamControlView(BaseTeamView):
-    def __init__(self, team: Team):
-        super().__init__(timeout=None)
-        self.team = team
-
-    @ui.button(label="참가", style=discord.ButtonStyle.success)
-    async def join(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer()
-        with get_session() as session:
-            await join_team(session, interaction, self.team)
-
-    @ui.button(label="떠나기", style=discord.ButtonStyle.secondary)
-    async def left(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer()
-        with get_session() as session:
-            await left_team(session, interaction, self.team)
-
-    @ui.button(label="팀 섞기", style=discord.ButtonStyle.primary)
-    async def shuffle(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer()
-        with get_session() as session:
-            self.team = session.get(Team, self.team.id)
-            message = await controller.fetch_message(interaction.channel, self.team)
-            members = self.team.members
-
-            team_idx = await handler.get_random_team(session, self.team)
-            if len(members) == 5:
-                await controller.send_rank_team(message, self.team, team_idx)
-            else:
-                await controller.send_custom_team(message, self.team, team_idx)
-
-    @ui.button(label="팀 삭제", style=discord.ButtonStyle.danger)
-    async def delete(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer()
-        with get_session() as session:
-            self.team = session.get(Team, self.team.id)
+            await controller.defer(interaction)
+            self.team = await cache.get_team(self.team.id)
             message = await controller.fetch_message(interaction.channel, self.team)
-            await handler.delete_team(session, self.team)
-            await controller.send_delete_alert(message, self.team)
-            logger.info(
-                f"{interaction.user.name} (ID: {interaction.user.id}) deleted the team {self.team.name} (ID: {self.team.id})."
+            await controller.show_team_detail(message, self.team)
+            view = TeamControlView(self.team.id)
+            await interaction.followup.send(
+                f"**{self.team.name}**팀 메뉴", view=view, ephemeral=True
             )
+            self.view.stop()
+
+
+class TeamControlView(ui.View):
+    def __init__(self, team_id: int):
+        super().__init__(timeout=None)
+        for action in TEAM_ACTIONS:
+            self.add_item(TeamButton(action, team_id))
 
 
 class TeamShuffleView(BaseTeamView):
-    def __init__(self, teams: list[Team]):
+    def __init__(self, teams: list[TeamSnapshot]):
         super().__init__(timeout=10)
         for team in teams:
             self.add_item(item=self.TeamButton(team))
 
     class TeamButton(ui.Button["TeamShuffleView"]):
-        def __init__(self, team: Team):
+        def __init__(self, team: TeamSnapshot):
             super().__init__(
                 label=team.name if len(team.name) < 10 else team.name[:10] + "...",
                 style=discord.ButtonStyle.primary,
@@ -167,62 +164,97 @@ class TeamShuffleView(BaseTeamView):
             self.team = team
 
         async def callback(self, interaction: discord.Interaction):
-            await interaction.response.defer()
-            with get_session() as session:
-                self.team = session.get(Team, self.team.id)
-                message = await controller.fetch_message(interaction.channel, self.team)
-                members = self.team.members
-
-                team_idx = await handler.get_random_team(session, self.team)
-                if len(members) == 5:
-                    await controller.send_rank_team(message, self.team, team_idx)
-                else:
-                    await controller.send_custom_team(message, self.team, team_idx)
-
-
-async def join_team(db: Session, interaction: "discord.Interaction", team: Team):
-    team = db.get(Team, team.id)
-    await handler.add_member(
-        db,
-        team,
-        interaction.user.id,
-        interaction.user.name,
-    )
-    message = await controller.fetch_message(interaction.channel, team)
-    await controller.send_join_alert(
-        message,
-        team,
-        interaction.user.id,
-    )
-    await controller.update_team_message(
-        message,
-        team,
-        JoinTeamView(team),
-    )
+            await controller.defer(interaction)
+            await shuffle_team(interaction, self.team.id)
+
+
+class TeamDraftView(BaseTeamView):
+    def __init__(self, teams: list[TeamSnapshot]):
+        super().__init__(timeout=10)
+        for team in teams:
+            self.add_item(item=self.TeamButton(team))
+
+    class TeamButton(ui.Button["TeamDraftView"]):
+        def __init__(self, team: TeamSnapshot):
+            super().__init__(
+                label=team.name if len(team.name) < 10 else team.name[:10] + "...",
+                style=discord.ButtonStyle.primary,
+            )
+            self.team = team
+
+        async def callback(self, interaction: discord.Interaction):
+            await controller.defer(interaction)
+            await draft_team(interaction, self.team.id)
+
+
+async def join_team(interaction: "discord.Interaction", team_id: int):
+    async with team_locks.hold(team_id):
+        team = await cache.add_member(
+            team_id,
+            interaction.user.id,
+            interaction.user.name,
+        )
+        message = await controller.fetch_message(interaction.channel, team)
+        team_renderer.render(
+            message,
+            team,
+            JoinTeamView(team.id),
+            joined=interaction.user.id,
+        )
     logger.info(
         f"{interaction.user.name} (ID: {interaction.user.id}) joined the team {team.name} (ID: {team.id})."
     )
 
 
-async def left_team(db: Session, interaction: "discord.Interaction", team: Team):
-    team = db.get(Team, team.id)
-    await handler.remove_member(
-        db,
-        team,
-        interaction.user.id,
-        interaction.user.name,
+async def left_team(interaction: "discord.Interaction", team_id: int):
+    async with team_locks.hold(team_id):
+        team = await cache.remove_member(
+            team_id,
+            interaction.user.id,
+            interaction.user.name,
+        )
+        message = await controller.fetch_message(interaction.channel, team)
+        team_renderer.render(
+            message,
+            team,
+            JoinTeamView(team.id),
+            left=interaction.user.id,
+        )
+    logger.info(
+        f"{interaction.user.name} (ID: {interaction.user.id}) left the team {team.name} (ID: {team.id})."
     )
+
+
+async def shuffle_team(interaction: "discord.Interaction", team_id: int):
+    team, team_idx = await cache.get_random_team(team_id)
     message = await controller.fetch_message(interaction.channel, team)
-    await controller.send_left_alert(
-        message,
-        team,
-        interaction.user.id,
-    )
-    await controller.update_team_message(
-        message,
-        team,
-        JoinTeamView(team),
-    )
+    if len(team.members) == handler.LANE_COUNT:
+        await controller.send_rank_team(message, team, team_idx)
+    else:
+        await controller.send_custom_team(message, team, team_idx)
+
+
+async def draft_team(interaction: "discord.Interaction", team_id: int):
+    team, ratings, lane_weights = await cache.get_draft_team(team_id)
+    message = await controller.fetch_message(interaction.channel, team)
+    lobbies, with_lane = await handler.draft(ratings, lane_weights)
+    await controller.send_draft_team(message, team, lobbies, with_lane)
+
+
+async def delete_team(interaction: "discord.Interaction", team_id: int):
+    async with team_locks.hold(team_id):
+        team = await cache.get_team(team_id)
+        message = await controller.fetch_message(interaction.channel, team)
+        team = await cache.delete_team(team_id)
+    await controller.send_delete_alert(message, team)
     logger.info(
-        f"{interaction.user.name} (ID: {interaction.user.id}) left the team {team.name} (ID: {team.id})."
+        f"{interaction.user.name} (ID: {interaction.user.id}) deleted the team {team.name} (ID: {team.id})."
     )
+
+
+ACTION_HANDLERS = {
+    "join": join_team,
+    "left": left_team,
+    "shuffle": shuffle_team,
+    "delete": delete_team,
+}
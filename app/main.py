@@ -1,57 +1,31 @@
+# imported first, so the timeline includes the time spent importing
+from .common.startup import startup_timeline
+
+startup_timeline.start("imports")
+
 import os
 
-import discord
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
 from .bot import ServantBot
+from .common.profile import get_profile
 
-"""	
-Setup bot intents (events restrictions)
-For more information about intents, please go to the following websites:
-https://discordpy.readthedocs.io/en/latest/intents.html
-https://discordpy.readthedocs.io/en/latest/intents.html#privileged-intents
-
-
-Default Intents:
-intents.bans = True
-intents.dm_messages = True
-intents.dm_reactions = True
-intents.dm_typing = True
-intents.emojis = True
-intents.emojis_and_stickers = True
-intents.guild_messages = True
-intents.guild_reactions = True
-intents.guild_scheduled_events = True
-intents.guild_typing = True
-intents.guilds = True
-intents.integrations = True
-intents.invites = True
-intents.messages = True # `message_content` is required to get the content of the messages
-intents.reactions = True
-intents.typing = True
-intents.voice_states = True
-intents.webhooks = True
-
-Privileged Intents (Needs to be enabled on developer portal of Discord), please use them only if you need them:
-intents.members = True
-intents.message_content = True
-intents.presences = True
-"""
-
-intents = discord.Intents.default()
+startup_timeline.stop("imports")
 
 """
-Uncomment this if you want to use prefix (normal) commands.
-It is recommended to use slash commands and therefore not use prefix commands.
+Gateway profiles (GATEWAY_PROFILE) set the intents and what is cached:
 
-If you want to use prefix commands, make sure to also enable the intent below in the Discord developer portal.
-"""
-intents.message_content = True
-intents.members = True
-intents.presences = True
+minimal: slash commands and buttons only.
+team: team commands, including prefix commands (`message_content`).
+monitor: full member lists and presences (`members`, `presences`).
 
+Privileged intents need to be enabled on the developer portal of Discord.
+For more information about intents, please go to the following website:
+https://discordpy.readthedocs.io/en/latest/intents.html
+"""
+profile = get_profile(os.getenv("GATEWAY_PROFILE", "team"))
 
-bot = ServantBot(intents=intents)
+bot = ServantBot(profile)
 bot.run(os.getenv("TOKEN", ""))
@@ -0,0 +1,161 @@
+"""
+Concurrent join and leave stress test.
+
+Fires hundreds of concurrent joins, duplicate clicks and leaves at one team
+while another team is joined in parallel, the way the "참가" button is hit
+right after a team is posted. Runs against a fresh SQLite file and prints a
+JSON report.
+
+    python -m benchmarks.joins --users 300 --edit-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+# never touch the configured database
+os.environ["DATABASE_TYPE"] = "sqlite"
+os.environ["SQLITE_FILE_NAME"] = os.path.join(tempfile.mkdtemp(), "joins.db")
+
+from sqlmodel import select  # noqa: E402
+
+from app.core.database import create_db_and_tables, run_in_session  # noqa: E402
+from app.core.error.team import TeamError  # noqa: E402
+from app.core.model.team import Member  # noqa: E402
+from app.core.team import cache  # noqa: E402
+from app.core.team.lock import team_locks  # noqa: E402
+
+
+class Embed:
+    """
+    Stands in for the team message, recording the member count of every edit.
+    """
+
+    def __init__(self, edit_ms: float) -> None:
+        self.edit_ms = edit_ms
+        self.counts: list[int] = []
+
+    async def edit(self, members: int) -> None:
+        await asyncio.sleep(random.uniform(0, self.edit_ms) / 1000)
+        self.counts.append(members)
+
+
+async def change(
+    team_id: int, user_id: int, embed: Embed, join: bool, locked: bool
+) -> bool:
+    async def apply() -> None:
+        if join:
+            team = await cache.add_member(team_id, user_id, f"user-{user_id}")
+        else:
+            team = await cache.remove_member(team_id, user_id, f"user-{user_id}")
+        await embed.edit(len(team.members))
+
+    try:
+        if locked:
+            async with team_locks.hold(team_id):
+                await apply()
+        else:
+            await apply()
+    except TeamError:
+        return False
+    return True
+
+
+def get_member_ids(db, team_id: int) -> list[int]:
+    return db.exec(select(Member.discord_id).where(Member.team_id == team_id)).all()
+
+
+def lost_updates(counts: list[int]) -> int:
+    """
+    Edits that showed fewer changes than had been applied before them.
+    """
+    return sum(1 for a, b in zip(counts, counts[1:]) if abs(b - a) != 1)
+
+
+async def run_team(
+    team_id: int, users: list[int], edit_ms: float, locked: bool
+) -> dict:
+    embed = Embed(edit_ms)
+    embed.counts.append(1)
+    # every user clicks twice
+    clicks = [user for user in users for _ in range(2)]
+    random.shuffle(clicks)
+
+    started = time.perf_counter()
+    joined = await asyncio.gather(
+        *[change(team_id, user, embed, True, locked) for user in clicks]
+    )
+    joined_at = time.perf_counter()
+    member_ids = await run_in_session(get_member_ids, team_id)
+
+    left = await asyncio.gather(
+        *[change(team_id, user, embed, False, locked) for user in users]
+    )
+    finished = time.perf_counter()
+    remaining = await run_in_session(get_member_ids, team_id)
+
+    return {
+        "team_id": team_id,
+        "clicks": len(clicks),
+        "joined": sum(joined),
+        "rejected": len(clicks) - sum(joined),
+        "members": len(member_ids),
+        "duplicate_members": len(member_ids) - len(set(member_ids)),
+        "left": sum(left),
+        "remaining": len(remaining),
+        "lost_embed_updates": lost_updates(embed.counts),
+        "final_embed_count": embed.counts[-1],
+        "join_ms": (joined_at - started) * 1000,
+        "leave_ms": (finished - joined_at) * 1000,
+        "started": started,
+        "finished": finished,
+    }
+
+
+async def run(users: int, edit_ms: float, seed: int) -> dict:
+    random.seed(seed)
+    await asyncio.get_running_loop().run_in_executor(None, create_db_and_tables)
+    await cache.warm_cache()
+
+    report = {"users": users, "edit_ms": edit_ms, "seed": seed}
+    for locked in (True, False):
+        teams = [
+            await cache.start_team(0, f"stress-{name}", 0, 0, 0, "owner")
+            for name in ("a", "b")
+        ]
+        results = await asyncio.gather(
+            run_team(teams[0].id, list(range(1, users + 1)), edit_ms, locked),
+            run_team(teams[1].id, list(range(1, users // 10 + 1)), edit_ms, locked),
+        )
+        overlap = min(r["finished"] for r in results) - max(
+            r["started"] for r in results
+        )
+        for result in results:
+            del result["started"], result["finished"]
+        report["locked" if locked else "unlocked"] = {
+            "teams": results,
+            "parallel_overlap_ms": max(overlap, 0) * 1000,
+        }
+    report["locks_left"] = len(team_locks)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument(
+        "--edit-ms", type=float, default=5, help="upper bound of a message edit"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.users, args.edit_ms, args.seed))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Shuffle latency and fairness benchmark.
+
+Runs offline against an in-memory SQLite database and prints a JSON report,
+so results of two releases can be diffed.
+
+    python -m benchmarks.shuffle --history 0 1000 100000 --output bench.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import statistics
+import time
+from itertools import permutations
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.core.database import count_queries
+from app.core.model.team import Member, Rating, Team, TeamHistory
+from app.core.team import handler
+
+HISTORY_SIZES = [0, 100, 1000, 10000, 100000]
+CUSTOM_SIZES = [10, 15, 20]
+TEAM_LIST_SIZES = [1, 10, 25]
+
+
+def create_memory_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def create_team(db: Session, size: int, guild_id: int = 0) -> Team:
+    team = Team(name=f"bench-{size}", message_id=0, guild_id=guild_id)
+    db.add(team)
+    db.commit()
+    for idx in range(size):
+        discord_id = team.id * 1000 + idx
+        db.add(Member(discord_id=discord_id, name=f"member-{idx}", team_id=team.id))
+    db.commit()
+    db.refresh(team)
+    return team
+
+
+def insert_histories(db: Session, team: Team, count: int) -> None:
+    rows = []
+    for _ in range(count):
+        record = list(range(handler.LANE_COUNT))
+        random.shuffle(record)
+        rows.append({"numbers": TeamHistory.encode(record), "team_id": team.id})
+    if rows:
+        db.connection().execute(TeamHistory.__table__.insert(), rows)
+    db.commit()
+
+
+def percentile(samples: list[float], pct: int) -> float:
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+def latency_report(samples: list[float]) -> dict:
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def expected_rejection_retries(weights: list[list[float]]) -> float:
+    """
+    Expected retries of the former rejection sampler, which drew a lane per
+    member independently until the draw was a permutation.
+    """
+    normalized = [[w / sum(row) for w in row] for row in weights]
+    accept = sum(
+        math.prod(normalized[member][lane] for member, lane in enumerate(perm))
+        for perm in permutations(range(len(weights)))
+    )
+    return 1 / accept - 1
+
+
+def lane_entropy(records: list[list[int]]) -> list[float]:
+    """
+    Normalized Shannon entropy of the lanes played by each member, where 1.0
+    means every lane was played equally often.
+    """
+    size = handler.LANE_COUNT
+    counts = [[0] * size for _ in range(size)]
+    for record in records:
+        for lane, member in enumerate(record):
+            counts[member][lane] += 1
+    entropies = []
+    for row in counts:
+        total = sum(row)
+        entropy = -sum(c / total * math.log(c / total) for c in row if c)
+        entropies.append(entropy / math.log(size))
+    return entropies
+
+
+def bench_rank(engine, history: int, shuffles: int) -> dict:
+    with Session(engine) as db:
+        team = create_team(db, handler.LANE_COUNT)
+        insert_histories(db, team, history)
+
+        started = time.perf_counter()
+        handler.rebuild_weight(db, team)
+        db.commit()
+        rebuild = time.perf_counter() - started
+
+        weight_samples = []
+        for _ in range(min(shuffles, 100)):
+            started = time.perf_counter()
+            handler._get_weight(db, team)
+            weight_samples.append(time.perf_counter() - started)
+        retries = expected_rejection_retries(handler._get_weight(db, team))
+
+        started = time.perf_counter()
+        handler.get_lane_counts(db, team)
+        lane_counts = time.perf_counter() - started
+
+        samples = []
+        records = []
+        for _ in range(shuffles):
+            started = time.perf_counter()
+            records.append(handler.get_random_team(db, team.id)[1])
+            db.commit()
+            samples.append(time.perf_counter() - started)
+        entropy = lane_entropy(records)
+
+        return {
+            "history": history,
+            "rebuild_ms": rebuild * 1000,
+            "get_weight": latency_report(weight_samples),
+            "lane_counts_ms": lane_counts * 1000,
+            "shuffle": latency_report(samples),
+            "expected_rejection_retries": retries,
+            "lane_entropy": {
+                "members": entropy,
+                "min": min(entropy),
+                "mean": statistics.fmean(entropy),
+            },
+        }
+
+
+def bench_custom(engine, size: int, shuffles: int, rated: bool) -> dict:
+    with Session(engine) as db:
+        team = create_team(db, size)
+        if rated:
+            for member in team.members:
+                db.add(
+                    Rating(
+                        guild_id=team.guild_id,
+                        discord_id=member.discord_id,
+                        rating=random.randint(0, 3000),
+                    )
+                )
+            db.commit()
+
+        samples = []
+        for _ in range(shuffles):
+            started = time.perf_counter()
+            handler.shuffle_custom(db, team)
+            db.commit()
+            samples.append(time.perf_counter() - started)
+        return {"size": size, "rated": rated, "shuffle": latency_report(samples)}
+
+
+def bench_team_list(engine, teams: int, repeat: int) -> dict:
+    guild_id = random.getrandbits(32)
+    with Session(engine) as db:
+        for _ in range(teams):
+            create_team(db, handler.LANE_COUNT, guild_id)
+
+    samples = []
+    for _ in range(repeat):
+        with Session(engine) as db, count_queries(engine) as counter:
+            started = time.perf_counter()
+            for team in handler.get_team_list(db, guild_id):
+                len(team.members)
+            samples.append(time.perf_counter() - started)
+    return {"teams": teams, "queries": counter.count, "list": latency_report(samples)}
+
+
+def run(histories: list[int], shuffles: int, seed: int) -> dict:
+    random.seed(seed)
+    engine = create_memory_engine()
+    rank = [bench_rank(engine, history, shuffles) for history in histories]
+    custom = [
+        bench_custom(engine, size, shuffles, rated)
+        for size in CUSTOM_SIZES
+        for rated in (False, True)
+    ]
+    team_list = [bench_team_list(engine, teams, 100) for teams in TEAM_LIST_SIZES]
+    return {
+        "python": platform.python_version(),
+        "seed": seed,
+        "shuffles": shuffles,
+        "rank": rank,
+        "custom": custom,
+        "team_list": team_list,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--history", type=int, nargs="+", default=HISTORY_SIZES)
+    parser.add_argument("--shuffles", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report to a file")
+    args = parser.parse_args()
+
+    report = run(args.history, args.shuffles, args.seed)
+    dumped = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(dumped)
+    else:
+        print(dumped)
+
+
+if __name__ == "__main__":
+    main()
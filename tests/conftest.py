@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+# never touch the configured database, app.core.database connects on import
+os.environ["DATABASE_TYPE"] = "sqlite"
+os.environ["SQLITE_FILE_NAME"] = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.pop("REDIS_URL", None)
+
+import pytest  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+
+from app.core.model.team import Member, Team  # noqa: E402
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+
+def create_team(db: Session, size: int, guild_id: int | None = 1) -> Team:
+    team = Team(name=f"team-{size}", message_id=0, guild_id=guild_id)
+    db.add(team)
+    db.flush()
+    for idx in range(size):
+        db.add(Member(discord_id=idx + 1, name=f"member-{idx}", team_id=team.id))
+    db.commit()
+    return team
@@ -0,0 +1,54 @@
+import random
+from itertools import combinations
+from unittest import mock
+
+import pytest
+
+from app.core.team import balance
+
+
+def side_difference(ratings: list[float], order: list[int]) -> float:
+    side_size = (len(ratings) + 1) // 2
+    return abs(
+        sum(ratings[idx] for idx in order[:side_size])
+        - sum(ratings[idx] for idx in order[side_size:])
+    )
+
+
+def best_difference(ratings: list[float]) -> float:
+    total = sum(ratings)
+    side_size = (len(ratings) + 1) // 2
+    return min(
+        abs(total - 2 * sum(ratings[idx] for idx in side))
+        for side in combinations(range(len(ratings)), side_size)
+    )
+
+
+@pytest.mark.parametrize("count", range(2, 13))
+def test_split_is_within_tolerance_of_the_best(count):
+    rng = random.Random(count)
+    for _ in range(20):
+        ratings = [float(rng.randint(0, 3000)) for _ in range(count)]
+        order = balance.split_teams(ratings)
+        assert sorted(order) == list(range(count))
+        best = best_difference(ratings)
+        assert side_difference(ratings, order) <= best + balance.BALANCE_TOLERANCE
+        assert side_difference(ratings, balance.split_teams(ratings, 0)) == best
+
+
+def test_split_picks_among_near_optimal_splits():
+    ratings = [1000.0] * 10
+    sides = {frozenset(balance.split_teams(ratings)[:5]) for _ in range(50)}
+    assert len(sides) > 1
+
+
+@pytest.mark.parametrize("count", [25, 40, 100])
+def test_large_team_is_split_by_local_search(count):
+    rng = random.Random(count)
+    ratings = [float(rng.randint(0, 3000)) for _ in range(count)]
+    with mock.patch.object(balance, "_subset_sums") as subset_sums:
+        order = balance.split_teams(ratings)
+    subset_sums.assert_not_called()
+    assert sorted(order) == list(range(count))
+    # a swap would still lower a difference wider than every rating gap
+    assert side_difference(ratings, order) <= max(ratings) - min(ratings)
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from unittest import mock
+
+import fakeredis
+import pytest
+
+from app.core.database import create_db_and_tables, run_in_session
+from app.core.error.team import TeamNotFoundError
+from app.core.model.team import Team
+from app.core.team import cache
+from app.core.team.lock import team_locks
+from app.core.team.shared import SharedTeamState
+
+
+@pytest.fixture(autouse=True)
+def database():
+    create_db_and_tables()
+    cache.team_cache.warm([])
+    yield
+    cache.team_cache.warm([])
+
+
+def start_team() -> int:
+    async def main():
+        team = await cache.start_team(1, "team", 1, 1, 10, "first")
+        return team.id
+
+    return asyncio.run(main())
+
+
+def test_join_waiting_on_a_delete_does_not_restore_the_team():
+    team_id = start_team()
+
+    async def join() -> None:
+        async with team_locks.hold(team_id):
+            await cache.add_member(team_id, 20, "second")
+
+    async def delete() -> None:
+        async with team_locks.hold(team_id):
+            await cache.delete_team(team_id)
+
+    async def main():
+        results = await asyncio.gather(delete(), join(), return_exceptions=True)
+        assert isinstance(results[1], TeamNotFoundError)
+
+    asyncio.run(main())
+    assert cache.team_cache.get(team_id) is None
+    assert cache.team_cache.list(1) == []
+
+
+def test_failed_join_of_a_deleted_team_evicts_it():
+    team_id = start_team()
+    stale = cache.team_cache.get(team_id)
+
+    async def main():
+        await cache.delete_team(team_id)
+        # e.g. put back by a process that did not see the delete yet
+        cache.team_cache.put(stale)
+        with pytest.raises(TeamNotFoundError):
+            await cache.add_member(team_id, 20, "second")
+
+    asyncio.run(main())
+    assert cache.team_cache.get(team_id) is None
+
+
+def test_shuffle_does_not_overwrite_the_cached_team():
+    team_id = start_team()
+
+    async def main():
+        await cache.add_member(team_id, 20, "second")
+        joined = cache.team_cache.get(team_id)
+        await cache.get_random_team(team_id)
+        assert cache.team_cache.get(team_id) is joined
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def server():
+    server = fakeredis.FakeServer()
+    state = SharedTeamState(fakeredis.FakeAsyncRedis(server=server), 60)
+    with mock.patch.object(cache, "shared_state", state):
+        yield server
+    cache._unsynced.clear()
+
+
+def test_changes_fall_back_to_the_database_when_redis_is_down(server):
+    team_id = start_team()
+
+    async def main():
+        server.connected = False
+        team = await cache.add_member(team_id, 20, "second")
+        assert [member.discord_id for member in team.members] == [10, 20]
+        team = await cache.remove_member(team_id, 10, "first")
+        assert [member.discord_id for member in team.members] == [20]
+
+        # the shared members still list the first member, they are dropped
+        # instead of rejecting the join as a duplicate
+        server.connected = True
+        team = await cache.add_member(team_id, 10, "first")
+        assert [member.discord_id for member in team.members] == [20, 10]
+        assert not cache._unsynced
+        assert await cache.shared_state.add_member(team_id, 10) == 0
+
+    asyncio.run(main())
+
+
+def test_shuffle_weight_is_shared_and_stored(server):
+    team_id = start_team()
+
+    async def main():
+        for user_id in range(20, 24):
+            await cache.add_member(team_id, user_id, str(user_id))
+        for _ in range(3):
+            await cache.get_random_team(team_id)
+        return await cache.shared_state.get_weight(team_id)
+
+    shared = asyncio.run(main())
+
+    async def stored():
+        return await run_in_session(
+            lambda db: json.loads(db.get(Team, team_id).weight.weights)
+        )
+
+    assert shared is not None
+    assert asyncio.run(stored()) == shared
@@ -0,0 +1,106 @@
+import asyncio
+from datetime import datetime
+from unittest import mock
+
+import discord
+from discord import Embed
+
+from app.core.team import cache, controller
+from app.core.team.outbound import Priority
+from app.core.team.snapshot import MemberSnapshot, TeamSnapshot
+
+TEAM = TeamSnapshot(
+    id=1,
+    name="team",
+    message_id=100,
+    guild_id=1,
+    channel_id=1,
+    created_at=datetime.now(),
+    members=(MemberSnapshot(10, "first"), MemberSnapshot(20, "second")),
+)
+
+
+def team_message(value: str) -> mock.Mock:
+    embed = Embed(title="team")
+    embed.add_field(name=f"현제 인원: {len(TEAM.members)}", value=value)
+    message = mock.Mock(id=TEAM.message_id, embeds=[embed])
+    message.channel.id = TEAM.channel_id
+    message.edit = mock.AsyncMock(return_value=message)
+    return message
+
+
+def update(message: mock.Mock) -> None:
+    asyncio.run(controller.update_team_message(message, TEAM, None))
+    controller.message_cache.remove(message.id)
+
+
+def test_unchanged_embed_is_not_edited():
+    message = team_message("<@10> - <@20>")
+    update(message)
+    message.edit.assert_not_awaited()
+
+
+def test_changed_embed_is_edited():
+    message = team_message("<@10>")
+    update(message)
+    message.edit.assert_awaited_once()
+    assert message.edit.await_args.kwargs["embed"].fields[0].value == "<@10> - <@20>"
+
+
+def test_shared_state_always_edits():
+    # another process may have edited the message since it was cached
+    message = team_message("<@10> - <@20>")
+    with mock.patch.object(cache, "shared_state", mock.Mock()):
+        update(message)
+    message.edit.assert_awaited_once()
+
+
+def test_draft_reply_is_split_by_embed_size():
+    members = tuple(
+        MemberSnapshot(10**17 + idx, f"{idx:02}" + "x" * 30) for idx in range(100)
+    )
+    team = TEAM._replace(members=members)
+    lobbies = [list(range(idx, idx + 10)) for idx in range(0, 100, 10)]
+    message = team_message("")
+    message.reply = mock.AsyncMock()
+
+    asyncio.run(controller.send_draft_team(message, team, lobbies, with_lane=True))
+    replies = [call.kwargs["embeds"] for call in message.reply.await_args_list]
+    assert len(replies) > 1
+    assert sum(len(embeds) for embeds in replies) == 10
+    for embeds in replies:
+        assert sum(len(embed) for embed in embeds) <= 6000
+
+
+def test_slash_command_is_acknowledged_before_queued_replies():
+    sent = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def slow_reply() -> None:
+            await release.wait()
+            sent.append("state")
+
+        context = mock.Mock()
+        context.interaction.channel_id = 1
+        context.interaction.created_at = discord.utils.utcnow()
+        context.defer = mock.AsyncMock(side_effect=lambda **_: sent.append("ack"))
+
+        # a reply of another command is still being sent to the channel
+        queued = asyncio.create_task(
+            controller.scheduler.submit(1, Priority.STATE, slow_reply)
+        )
+        await asyncio.sleep(0)
+        await asyncio.wait_for(controller.defer_command(context, ephemeral=True), 1)
+        release.set()
+        await queued
+
+    asyncio.run(main())
+    assert sent == ["ack", "state"]
+
+
+def test_prefix_command_has_nothing_to_acknowledge():
+    context = mock.Mock(interaction=None)
+    asyncio.run(controller.defer_command(context))
+    context.defer.assert_not_called()
@@ -0,0 +1,125 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.database import assert_max_queries, count_queries
+from app.core.error.team import TeamError
+from app.core.model.team import TeamSummary, TeamWeight
+from app.core.team import handler
+
+from .conftest import create_team
+
+
+@pytest.mark.parametrize("count", [1, 10, 25])
+def test_get_team_list_query_count(engine, session, count):
+    for _ in range(count):
+        create_team(session, 5)
+    session.expunge_all()
+
+    # one query for the teams, one for the members of all of them
+    with assert_max_queries(2, engine):
+        teams = handler.get_team_list(session, 1)
+        names = [member.name for team in teams for member in team.members]
+    assert len(teams) == count
+    assert len(names) == count * 5
+
+
+def test_get_team_list_is_scoped_to_the_guild(session):
+    create_team(session, 5, guild_id=1)
+    create_team(session, 5, guild_id=2)
+
+    teams = handler.get_team_list(session, 2)
+    assert [team.guild_id for team in teams] == [2]
+
+
+def test_unresolved_teams_are_not_backfilled_again(session):
+    team = create_team(session, 5, guild_id=None)
+    assert [team.id for team in handler.get_unscoped_teams(session)] == [team.id]
+
+    handler.set_team_unresolved(session, team.id)
+    session.commit()
+    assert handler.get_unscoped_teams(session) == []
+
+
+def test_add_member_rejects_a_duplicate(session):
+    team = create_team(session, 2)
+    with pytest.raises(TeamError):
+        handler.add_member(session, team.id, 1, "member-0")
+
+
+def test_add_member_rejects_a_join_from_another_process(engine, session):
+    team = create_team(session, 2)
+    loaded = handler.get_team(session, team.id)
+    assert len(loaded.members) == 2
+
+    # another process adds the member after this session loaded the team
+    with Session(engine) as other:
+        handler.add_member(other, team.id, 10, "other")
+        other.commit()
+
+    with pytest.raises(TeamError):
+        handler.add_member(session, team.id, 10, "other")
+
+
+def test_ratings_are_scoped_to_the_guild(session):
+    team = create_team(session, 2, guild_id=1)
+    other = create_team(session, 2, guild_id=2)
+    handler.set_rating(session, 2, 1, 3000)
+    handler.set_rating(session, 2, 1, 1000)
+
+    assert handler.get_ratings(session, 1, [1, 2]) == {}
+    assert handler.get_ratings(session, 2, [1, 2]) == {1: 1000}
+    assert handler._get_member_ratings(session, team) is None
+    assert handler._get_member_ratings(session, other) == [1000, 1000]
+
+
+def test_lane_history_lowers_the_weight_of_played_lanes(session):
+    team = create_team(session, 10)
+    session.add(
+        TeamSummary(
+            team_id=0,
+            team_name="archived",
+            guild_id=1,
+            discord_id=1,
+            name="member-0",
+            lane_counts="3,0,0,0,1",
+            games=4,
+            team_created_at=datetime.now(),
+        )
+    )
+    session.commit()
+
+    weights = handler._get_member_lane_weights(session, team)
+    assert weights[1] == handler._base_weight()[0]
+    played = weights[0]
+    assert played[0] < played[4] < played[1]
+    assert played[1] == played[2] == played[3]
+
+
+def test_draft_assigns_every_lane_once():
+    ratings = [float(idx) for idx in range(20)]
+    weights = [handler._lane_weight([idx % 3, 0, 1, 0, 2]) for idx in range(20)]
+    lobbies = handler._draft(ratings, weights, with_lane=True)
+    assert sorted(member for lobby in lobbies for member in lobby) == list(range(20))
+    assert all(len(lobby) == handler.DRAFT_LOBBY_SIZE for lobby in lobbies)
+
+
+def test_known_weight_skips_loading_the_weight_row(engine, session):
+    team = create_team(session, handler.LANE_COUNT)
+    _, _, weight = handler.get_random_team(session, team.id)
+    session.commit()
+    session.expunge_all()
+
+    with count_queries(engine) as loaded:
+        handler.get_random_team(session, team.id)
+        session.commit()
+    session.expunge_all()
+    with count_queries(engine) as known:
+        _, _, new_weight = handler.get_random_team(session, team.id, weight)
+        session.commit()
+
+    assert known.count == loaded.count - 1, known.statements
+    stored = session.exec(select(TeamWeight).where(TeamWeight.team_id == team.id))
+    assert json.loads(stored.one().weights) == new_weight
@@ -0,0 +1,45 @@
+import asyncio
+
+from app.core.team.lock import TeamLocks
+
+
+def test_changes_of_one_team_run_in_order():
+    async def main():
+        locks = TeamLocks()
+        running, order = [], []
+
+        async def change(team_id: int, idx: int) -> None:
+            async with locks.hold(team_id):
+                running.append(team_id)
+                assert running.count(team_id) == 1
+                await asyncio.sleep(0.001)
+                order.append(idx)
+                running.remove(team_id)
+
+        await asyncio.gather(*[change(1, idx) for idx in range(50)])
+        assert order == list(range(50))
+        assert len(locks) == 0
+
+    asyncio.run(main())
+
+
+def test_other_teams_proceed_in_parallel():
+    async def main():
+        locks = TeamLocks()
+        first_held = asyncio.Event()
+        release_first = asyncio.Event()
+
+        async def hold_first() -> None:
+            async with locks.hold(1):
+                first_held.set()
+                await release_first.wait()
+
+        task = asyncio.create_task(hold_first())
+        await first_held.wait()
+        async with locks.hold(2):
+            assert len(locks) == 2
+        release_first.set()
+        await task
+        assert len(locks) == 0
+
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.core.database.migration import (
+    MIGRATIONS,
+    migrate_history_numbers,
+    run_migrations,
+)
+from app.core.model.team import Member, Team, TeamHistory
+
+# the tables as the bot created them before any migration existed
+BASELINE_SCHEMA = [
+    """
+    CREATE TABLE team (
+        id INTEGER NOT NULL PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        message_id BIGINT,
+        always_active BOOLEAN NOT NULL,
+        created_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE member (
+        id INTEGER NOT NULL PRIMARY KEY,
+        discord_id BIGINT,
+        name VARCHAR NOT NULL,
+        team_id INTEGER NOT NULL REFERENCES team (id)
+    )
+    """,
+    """
+    CREATE TABLE teamhistory (
+        id INTEGER NOT NULL PRIMARY KEY,
+        numbers VARCHAR NOT NULL,
+        created_at DATETIME NOT NULL,
+        team_id INTEGER NOT NULL REFERENCES team (id)
+    )
+    """,
+    """
+    CREATE TABLE target (
+        id INTEGER NOT NULL PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        discord_id BIGINT,
+        guild_id BIGINT,
+        channel_id BIGINT
+    )
+    """,
+    """
+    CREATE TABLE targetstate (
+        id INTEGER NOT NULL PRIMARY KEY,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME,
+        alerted BOOLEAN NOT NULL,
+        target_id INTEGER NOT NULL REFERENCES target (id)
+    )
+    """,
+]
+
+HISTORIES = ["[3, 0, 1, 4, 2]", "[0, 1, 2, 3, 4]", "42013"]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(
+            text(
+                "INSERT INTO team (id, name, message_id, always_active, created_at) "
+                "VALUES (1, 'team', 10, 0, '2024-01-01 00:00:00')"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO member (id, discord_id, name, team_id) "
+                "VALUES (1, 100, 'first', 1), (2, 200, 'second', 1), "
+                "(3, 100, 'first again', 1)"
+            )
+        )
+        for numbers in HISTORIES:
+            connection.execute(
+                text(
+                    "INSERT INTO teamhistory (numbers, created_at, team_id) "
+                    "VALUES (:numbers, '2024-01-01 00:00:00', 1)"
+                ),
+                {"numbers": numbers},
+            )
+    yield engine
+    engine.dispose()
+
+
+def migrate(engine):
+    # the same order as create_db_and_tables
+    SQLModel.metadata.create_all(engine)
+    return run_migrations(engine)
+
+
+def test_run_migrations_upgrades_the_baseline_schema(engine):
+    done = migrate(engine)
+    assert [migration.version for migration in done] == [
+        version for version, _, _ in MIGRATIONS
+    ]
+
+    columns = {column["name"] for column in inspect(engine).get_columns("team")}
+    assert {"guild_id", "channel_id", "unresolved_at"} <= columns
+
+    with Session(engine) as session:
+        histories = session.exec(select(TeamHistory).order_by(TeamHistory.id)).all()
+        assert [history.numbers for history in histories] == [
+            "30142",
+            "01234",
+            "42013",
+        ]
+        members = session.exec(select(Member).order_by(Member.id)).all()
+        assert [(member.id, member.discord_id) for member in members] == [
+            (1, 100),
+            (2, 200),
+        ]
+        team = session.get(Team, 1)
+        assert team.guild_id is None and team.unresolved_at is None
+
+
+def test_run_migrations_creates_the_indexes(engine):
+    migrate(engine)
+
+    indexes = {
+        table: {index["name"]: index for index in inspect(engine).get_indexes(table)}
+        for table in ("team", "member", "teamhistory", "targetstate")
+    }
+    assert indexes["member"]["uq_member_team_id_discord_id"]["unique"]
+    assert "ix_member_team_id" in indexes["member"]
+    assert "ix_teamhistory_team_id" in indexes["teamhistory"]
+    assert "ix_team_created_at" in indexes["team"]
+    assert "ix_team_guild_id_created_at" in indexes["team"]
+    assert "ix_targetstate_target_id" in indexes["targetstate"]
+
+
+def test_run_migrations_applies_nothing_twice(engine):
+    migrate(engine)
+
+    assert migrate(engine) == []
+
+
+def test_run_migrations_on_a_new_database():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    try:
+        assert len(migrate(engine)) == len(MIGRATIONS)
+        assert migrate(engine) == []
+    finally:
+        engine.dispose()
+
+
+def test_migrate_history_numbers_in_batches(engine):
+    SQLModel.metadata.create_all(engine)
+
+    assert migrate_history_numbers(engine, batch_size=1) == 2
+    assert migrate_history_numbers(engine, batch_size=1) == 0
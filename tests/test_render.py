@@ -0,0 +1,39 @@
+import asyncio
+from unittest import mock
+
+from app.core.team import controller
+from app.core.team.render import TeamRenderer
+
+
+def render_and_flush(delay: float) -> list[int]:
+    """
+    Render two messages `delay` seconds apart and flush all of them, while
+    every edit takes longer than the render window.
+    """
+    edits = []
+
+    async def update_team_message(message, team, view) -> None:
+        await asyncio.sleep(0.1)
+        edits.append(message.id)
+
+    async def main() -> None:
+        renderer = TeamRenderer(window=0.05)
+        renderer.render(mock.Mock(id=1), mock.Mock(), None)
+        await asyncio.sleep(delay)
+        renderer.render(mock.Mock(id=2), mock.Mock(), None)
+        await renderer.flush_all()
+        assert not renderer._pending
+        assert not renderer._tasks
+
+    with mock.patch.object(controller, "update_team_message", update_team_message):
+        asyncio.run(main())
+    return edits
+
+
+def test_flush_all_sends_every_pending_render():
+    assert sorted(render_and_flush(0)) == [1, 2]
+
+
+def test_flush_all_waits_for_timers_firing_meanwhile():
+    # the timer of the second message fires while the first one is flushed
+    assert sorted(render_and_flush(0.03)) == [1, 2]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from app.core.model.team import Member, Team, TeamHistory, TeamSummary
+from app.core.team import retention
+
+from .conftest import create_team
+
+# member index of every lane, one game per entry
+GAMES = ["30142", "01234", "01234", "43210"]
+
+
+def create_expired_team(db: Session, always_active: bool = False) -> Team:
+    team = create_team(db, 5)
+    team.created_at = datetime.now() - timedelta(days=365)
+    team.always_active = always_active
+    db.add(team)
+    for numbers in GAMES:
+        db.add(TeamHistory(numbers=numbers, team_id=team.id))
+    db.commit()
+    return team
+
+
+def get_summaries(db: Session) -> list[TeamSummary]:
+    return db.exec(select(TeamSummary).order_by(TeamSummary.discord_id)).all()
+
+
+def test_prune_teams_archives_lane_counts_and_games(session):
+    team = create_expired_team(session)
+
+    report = retention.prune_teams(session)
+    assert (report.teams, report.members, report.histories) == (1, 5, len(GAMES))
+
+    summaries = get_summaries(session)
+    assert [summary.lane_counts for summary in summaries] == [
+        "2,1,0,0,1",
+        "0,2,1,1,0",
+        "0,0,3,0,1",
+        "1,1,0,2,0",
+        "1,0,0,1,2",
+    ]
+    assert [summary.games for summary in summaries] == [len(GAMES)] * 5
+    assert {summary.team_id for summary in summaries} == {team.id}
+    assert session.get(Team, team.id) is None
+    assert session.exec(select(Member)).all() == []
+    assert session.exec(select(TeamHistory)).all() == []
+
+
+def test_prune_teams_deletes_histories_in_batches(session):
+    create_expired_team(session)
+
+    report = retention.prune_teams(session, batch_size=3)
+    assert report.histories == len(GAMES)
+    assert session.exec(select(TeamHistory)).all() == []
+
+
+def test_prune_teams_keeps_always_active_teams(session):
+    team = create_expired_team(session, always_active=True)
+
+    report = retention.prune_teams(session)
+    assert report.teams == 0
+    assert session.get(Team, team.id) is not None
+    assert get_summaries(session) == []
+
+
+def test_prune_teams_finishes_a_partial_run_without_archiving_twice(session):
+    team = create_expired_team(session)
+    # a run that stopped after archiving the team but before deleting it
+    retention.archive_team(session, team)
+
+    report = retention.prune_teams(session)
+    assert (report.teams, report.members, report.histories) == (1, 0, len(GAMES))
+    assert len(get_summaries(session)) == 5
+    assert session.get(Team, team.id) is None
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from app.core.team.shared import SharedTeamState
+from app.core.team.snapshot import MemberSnapshot, TeamSnapshot
+
+TTL = 60
+
+
+def snapshot(team_id: int, *user_ids: int) -> TeamSnapshot:
+    return TeamSnapshot(
+        id=team_id,
+        name=f"team-{team_id}",
+        message_id=0,
+        guild_id=1,
+        channel_id=1,
+        created_at=datetime.now(),
+        members=tuple(MemberSnapshot(user_id, str(user_id)) for user_id in user_ids),
+    )
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def shared_state(server: fakeredis.FakeServer) -> SharedTeamState:
+    """
+    State of one bot process, all of them connected to the same server.
+    """
+    return SharedTeamState(fakeredis.FakeAsyncRedis(server=server), TTL)
+
+
+def test_unknown_team_falls_back_to_the_database(server):
+    async def main():
+        state = shared_state(server)
+        assert await state.add_member(1, 10) == -1
+        assert await state.remove_member(1, 10) == -1
+
+    asyncio.run(main())
+
+
+def test_join_and_leave_are_checked_across_processes(server):
+    async def main():
+        first, second = shared_state(server), shared_state(server)
+        await first.seed(snapshot(1, 10))
+
+        assert await first.add_member(1, 10) == 0
+        assert await first.add_member(1, 20) == 1
+        assert await second.add_member(1, 20) == 0
+        assert await second.remove_member(1, 20) == 1
+        assert await first.remove_member(1, 20) == 0
+        assert await first.client.ttl("team:1:members") == TTL
+
+    asyncio.run(main())
+
+
+def test_concurrent_duplicate_joins_add_once(server):
+    async def main():
+        states = [shared_state(server) for _ in range(5)]
+        await states[0].seed(snapshot(1, 99))
+        results = await asyncio.gather(
+            *[state.add_member(1, 10) for state in states for _ in range(20)]
+        )
+        assert sorted(results) == [0] * 99 + [1]
+
+    asyncio.run(main())
+
+
+def test_seed_replaces_and_drop_forgets_members(server):
+    async def main():
+        state = shared_state(server)
+        await state.seed(snapshot(1, 10, 20))
+        await state.seed(snapshot(1, 30))
+        assert await state.add_member(1, 10) == 1
+        assert await state.add_member(1, 30) == 0
+
+        await state.drop(1)
+        assert await state.add_member(1, 30) == -1
+
+    asyncio.run(main())
+
+
+def test_invalidation_reaches_other_processes_only(server):
+    async def main():
+        first, second = shared_state(server), shared_state(server)
+        reloaded = {"first": asyncio.Queue(), "second": asyncio.Queue()}
+
+        async def reload_first(team_id: int) -> None:
+            await reloaded["first"].put(team_id)
+
+        async def reload_second(team_id: int) -> None:
+            await reloaded["second"].put(team_id)
+
+        first.start_listener(reload_first)
+        second.start_listener(reload_second)
+        # wait until both listeners are subscribed
+        while (await first.client.pubsub_numsub("team:invalidate"))[0][1] < 2:
+            await asyncio.sleep(0.01)
+
+        await first.publish(1)
+        assert await asyncio.wait_for(reloaded["second"].get(), 1) == 1
+        await second.publish(2)
+        assert await asyncio.wait_for(reloaded["first"].get(), 1) == 2
+        assert reloaded["first"].empty() and reloaded["second"].empty()
+
+        await first.close()
+        await second.close()
+
+    asyncio.run(main())